@@ -0,0 +1,60 @@
+"""Query latency of contraction hierarchies against branch_and_bound on
+seeded RandomGraph instances. Run it from the repository root:
+
+    python -m benchmark.contraction --sizes 1000 5000 --queries 100
+"""
+import argparse
+import random
+import time
+from statistics import median
+
+from core.contraction import ContractionHierarchy
+from core.graph import RandomGraph
+from core.problem import GPSProblem
+from core.search import branch_and_bound
+from core.utils import print_table
+
+
+def seeded_graph(size, min_links=3, seed=0):
+    """Return RandomGraph(range(size)) as laid out after random.seed(seed)."""
+    random.seed(seed)
+    return RandomGraph(list(range(size)), min_links)
+
+
+def run(size, queries, min_links=3, seed=0):
+    """Return a table row comparing both methods on one graph size."""
+    graph = seeded_graph(size, min_links, seed)
+    start = time.perf_counter()
+    hierarchy = ContractionHierarchy(graph)
+    preprocessing = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    pairs = [(rng.randrange(size), rng.randrange(size)) for _ in range(queries)]
+    bab_times, ch_times, agree = [], [], 0
+    for (a, b) in pairs:
+        start = time.perf_counter()
+        expected = branch_and_bound(GPSProblem(a, b, graph))
+        bab_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        result = hierarchy.query(a, b)
+        ch_times.append(time.perf_counter() - start)
+        agree += (expected and expected[2]) == (result and result[2])
+    bab, ch = median(bab_times) * 1000, median(ch_times) * 1000
+    return [size, hierarchy.shortcut_count(), '%.3f' % preprocessing, '%.3f' % bab,
+            '%.3f' % ch, '%.1fx' % (bab / ch), '%d/%d' % (agree, queries)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--min-links', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rows = [run(size, args.queries, args.min_links, args.seed) for size in args.sizes]
+    print_table(rows, header=['nodes', 'shortcuts', 'preprocess s', 'B&B ms', 'CH ms',
+                              'speedup', 'same cost'], numfmt='%d')
+
+
+if __name__ == '__main__':
+    main()
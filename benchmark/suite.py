@@ -0,0 +1,161 @@
+"""Latency of the search algorithms on the romania routes and on seeded
+RandomGraph instances. Every query is run a few times untimed first, then
+timed for a number of repetitions; the median and percentiles are taken
+over the times of the single queries, all repetitions pooled.
+Run it from the repository root:
+
+    python -m benchmark.suite --sizes 100 1000 10000 --json results.json
+    python -m benchmark.suite --json new.json --baseline results.json
+
+With --memory each query is also run once under a MemoryMonitor, and the
+peak traced memory and bytes per generated node are reported. With
+--baseline, entries whose median time (or peak memory) grew by more than
+--threshold over the baseline are listed as regressions and the exit status
+is 1.
+Generating the graph itself is pure Python and takes minutes at 10**6 nodes.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from benchmark.contraction import seeded_graph
+from core.monitor import memory_report
+from core.problem import GPSProblem
+from core.search import ALGORITHMS, romania
+from core.utils import print_table
+
+ROUTES = [('A', 'B'), ('O', 'E'), ('G', 'Z'), ('N', 'D'), ('M', 'F')]
+
+
+def percentile(values, p):
+    """Return the p-th percentile (0 <= p <= 100) of values, interpolating
+    linearly between the two closest ranks."""
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def measure(function, warmup=2, repeat=10):
+    """Call function() warmup times, then return the time in seconds of
+    each of the next repeat calls."""
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summary(times):
+    """Return the statistics reported for a list of times, in milliseconds."""
+    ms = [t * 1000 for t in times]
+    return {'median_ms': percentile(ms, 50), 'p90_ms': percentile(ms, 90),
+            'p99_ms': percentile(ms, 99), 'min_ms': min(ms), 'samples': len(ms)}
+
+
+def workloads(sizes, queries, min_links=3, seed=0):
+    """Yield (graph name, graph, route name, [(start, goal)]) for each route
+    of romania and for each RandomGraph size, whose queries are reported
+    together."""
+    for (a, b) in ROUTES:
+        yield 'romania', romania, '%s-%s' % (a, b), [(a, b)]
+    for size in sizes:
+        graph = seeded_graph(size, min_links, seed)
+        rng = random.Random(seed)
+        pairs = [(rng.randrange(size), rng.randrange(size)) for _ in range(queries)]
+        yield 'random-%d' % size, graph, '%d queries' % queries, pairs
+
+
+def memory(search, problems):
+    """Return the largest peak memory of search over problems, and the peak
+    bytes per generated node over all of them."""
+    reports = [memory_report(search, p)[1] for p in problems]
+    generated = sum(r['generated'] for r in reports)
+    return {'peak_bytes': max(r['peak_bytes'] for r in reports),
+            'bytes_per_node': sum(r['peak_bytes'] for r in reports) / max(generated, 1)}
+
+
+def run(sizes, algorithms, queries=20, warmup=2, repeat=10, min_links=3, seed=0, memory_mode=False):
+    """Return the benchmark results as a JSON-ready dict."""
+    results = []
+    for (name, graph, route, pairs) in workloads(sizes, queries, min_links, seed):
+        problems = [GPSProblem(a, b, graph) for (a, b) in pairs]
+        for algorithm in algorithms:
+            search = ALGORITHMS[algorithm]
+            times = []
+            for p in problems:
+                times += measure(lambda: search(p), warmup, repeat)
+            entry = {'graph': name, 'route': route, 'algorithm': algorithm}
+            entry.update(summary(times))
+            if memory_mode:
+                entry.update(memory(search, problems))
+            results.append(entry)
+    return {'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                     'sizes': sizes, 'queries': queries, 'warmup': warmup, 'repeat': repeat,
+                     'min_links': min_links, 'seed': seed, 'memory': memory_mode},
+            'results': results}
+
+
+def compare(results, baseline, threshold=0.1):
+    """Return (entry, baseline entry, metric) for every result whose median
+    time, or peak memory when both runs measured it, is more than threshold
+    (a fraction) above the matching baseline entry."""
+    key = lambda e: (e['graph'], e['route'], e['algorithm'])
+    before = {key(e): e for e in baseline['results']}
+    regressions = []
+    for entry in results['results']:
+        old = before.get(key(entry))
+        for metric in ('median_ms', 'peak_bytes'):
+            if old and metric in entry and metric in old and entry[metric] > old[metric] * (1 + threshold):
+                regressions.append((entry, old, metric))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='*', default=[100, 1000, 10000])
+    parser.add_argument('--algorithms', nargs='+', default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--min-links', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory', action='store_true', help='also measure peak memory')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare against results saved with --json')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown of the median flagged as a regression (default 0.1)')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.algorithms, args.queries, args.warmup, args.repeat,
+                  args.min_links, args.seed, args.memory)
+    header = ['graph', 'route', 'algorithm', 'median ms', 'p90 ms', 'p99 ms', 'min ms']
+    if args.memory:
+        header += ['peak KiB', 'B/node']
+    print_table([[e['graph'], e['route'], e['algorithm']] +
+                 ['%.3f' % e[k] for k in ('median_ms', 'p90_ms', 'p99_ms', 'min_ms')] +
+                 (['%.1f' % (e['peak_bytes'] / 1024), '%.1f' % e['bytes_per_node']] if args.memory else [])
+                 for e in results['results']], header=header)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for (entry, before, metric) in regressions:
+            print('REGRESSION %s %s %s %s: %.3f -> %.3f' % (
+                entry['graph'], entry['route'], entry['algorithm'], metric,
+                before[metric], entry[metric]))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Searches that share an asyncio event loop.
+
+search_async steps through one of the core.search algorithms with
+graph_search_generator and hands control back to the event loop every few
+expansions, so a long query does not stall the other coroutines. Waiting
+for it can be cancelled like any task, and a timeout bounds how long it may
+run. solve_all runs many queries concurrently; since each one yields after
+the same number of expansions, they take turns on the loop fairly."""
+import asyncio
+
+from core.search import ALGORITHMS, graph_search_generator
+
+
+async def search_async(problem, algorithm='bab', expansions=100, timeout=None):
+    """Return what algorithm(problem) returns, (generated, visited,
+    path_cost, path) or None, running on the event loop. algorithm is one of
+    the names in core.search.ALGORITHMS or a function taking search= like
+    them. Control goes back to the loop after every expansions expansions.
+    Raises asyncio.TimeoutError once the search has run for more than
+    timeout seconds."""
+    algorithm = ALGORITHMS.get(algorithm, algorithm)
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    step = None
+    for (i, step) in enumerate(algorithm(problem, search=graph_search_generator), 1):
+        if i % expansions == 0:
+            await asyncio.sleep(0)
+            if deadline is not None and loop.time() > deadline:
+                raise asyncio.TimeoutError()
+    if step is None:
+        return None
+    generated, visited, path_cost, path = step[:4]
+    if not problem.goal_test(path[0].state):
+        return None
+    return generated, visited, path_cost, path
+
+
+async def solve_all(problems, algorithm='bab', expansions=100, timeout=None):
+    """Run search_async on every problem concurrently and return their
+    results in order. A query that fails, for instance with
+    asyncio.TimeoutError, gives its exception in its place instead of
+    stopping the others."""
+    return await asyncio.gather(*[search_async(p, algorithm, expansions, timeout)
+                                  for p in problems], return_exceptions=True)
@@ -0,0 +1,105 @@
+"""Batch solving of many route queries over one graph with a process pool.
+
+The graph is sent to every worker once, when the pool starts, instead of with
+each job. A CompactGraph goes further: its arrays are copied into a single
+shared memory block that the workers map, so they all read the same pages.
+Passing the name of a file written by save_compact_graph instead lets every
+worker map that file directly."""
+import multiprocessing
+from multiprocessing import shared_memory
+
+from core.graph import CompactGraph, _typecode, open_compact_graph
+from core.problem import GPSProblem
+from core.search import ALGORITHMS
+
+_ARRAYS = ('offsets', 'targets', 'weights', 'in_offsets', 'sources', 'xs', 'ys')
+
+_graph = None   # The graph each worker searches
+_memory = None  # Shared memory block backing _graph, kept open in the worker
+
+
+def _share(graph):
+    """Copy the arrays of a CompactGraph into a new SharedMemory block. Return
+    the block and the layout the workers need to rebuild the graph from it.
+    The arrays may be array.array objects or the memoryviews of a graph
+    opened with open_compact_graph."""
+    arrays = {key: getattr(graph, key, None) for key in _ARRAYS}
+    arrays['xs'] = arrays['ys'] = None
+    if hasattr(graph, 'locations'):
+        arrays['xs'], arrays['ys'] = graph.locations.xs, graph.locations.ys
+    arrays = {key: a for (key, a) in arrays.items() if a is not None}
+    size = sum(len(a) * a.itemsize for a in arrays.values())
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        layout, start = {}, 0
+        for (key, a) in arrays.items():
+            data = memoryview(a).cast('B')
+            memory.buf[start:start + len(data)] = data
+            layout[key] = (start, len(data), _typecode(a))
+            start += len(data)
+    except BaseException:
+        memory.close()
+        memory.unlink()
+        raise
+    return memory, (memory.name, layout, graph.names, graph.directed)
+
+
+def _attach(name, layout, names, directed):
+    """Rebuild in a worker the CompactGraph shared by _share. Workers use
+    the parent's resource tracker, so the block is only unlinked once, by
+    the parent."""
+    global _memory
+    _memory = shared_memory.SharedMemory(name=name)
+    arrays = {key: _memory.buf[start:start + size].cast(typecode)
+              for (key, (start, size, typecode)) in layout.items()}
+    return CompactGraph(names, arrays['offsets'], arrays['targets'], arrays['weights'],
+                        directed, arrays.get('in_offsets'), arrays.get('sources'),
+                        arrays.get('xs'), arrays.get('ys'))
+
+
+def _init_worker(graph, shared):
+    global _graph
+    if shared:
+        _graph = _attach(*shared)
+    elif isinstance(graph, str):
+        _graph = open_compact_graph(graph)
+    else:
+        _graph = graph
+
+
+def solve(graph, job):
+    """Run one (start, goal, algorithm) job over graph. algorithm is a key of
+    ALGORITHMS or a search function taking a problem. The path comes back as
+    a list of states (goal first, like Node.path) so it is cheap to send
+    between processes; None means no route was found."""
+    start, goal, algorithm = job
+    algorithm = ALGORITHMS.get(algorithm, algorithm)
+    result = algorithm(GPSProblem(start, goal, graph))
+    if result is None:
+        return None
+    generated, visited, path_cost, path = result
+    return generated, visited, path_cost, [node.state for node in path]
+
+
+def _solve(job):
+    return job, solve(_graph, job)
+
+
+def solve_batch(graph, jobs, processes=None, ordered=True, chunksize=64):
+    """Solve every (start, goal, algorithm) job in jobs on a pool of worker
+    processes, yielding (job, result) pairs as they come back: in submission
+    order if ordered, otherwise as soon as each job completes. See solve for
+    the shape of result. jobs may be any iterable, including a generator.
+    graph is a Graph, a CompactGraph or the name of a graph file."""
+    memory = shared = None
+    if isinstance(graph, CompactGraph):
+        memory, shared = _share(graph)
+        graph = None
+    try:
+        with multiprocessing.Pool(processes, _init_worker, (graph, shared)) as pool:
+            imap = pool.imap if ordered else pool.imap_unordered
+            yield from imap(_solve, jobs, chunksize)
+    finally:
+        if memory is not None:
+            memory.close()
+            memory.unlink()
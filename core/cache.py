@@ -0,0 +1,74 @@
+"""A bounded cache of search results in front of the core.search functions.
+
+Results are keyed on (graph, graph.version, start, goal, algorithm) and
+on the class of the problem, since a Problem subclass may score or cost the
+same route differently (an ALTProblem's h, for instance). Every
+Graph.connect/connect1 bumps graph.version, so an entry computed before an
+edge changed can never be served afterwards; the first query that sees a
+new version also drops the entries left over from the old one. When the
+cache is full the least recently used entry is evicted."""
+from collections import OrderedDict
+
+from core.search import ALGORITHMS
+from core.utils import Struct
+
+
+class RouteCache:
+    """LRU cache of search results, holding at most maxsize entries. hits,
+    misses, evictions and invalidations count what the cache did."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.versions = {}  # {graph: graph.version the cached entries were computed at}
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def solve(self, problem, algorithm='bab', key=None):
+        """Return algorithm(problem), from the cache when the same route was
+        asked for on the same version of problem.graph. algorithm is a
+        search function or one of the names in core.search.ALGORITHMS. Two
+        problems of the same class are taken to be interchangeable; when
+        they are not (e.g. ALTProblems with different landmarks), pass a
+        hashable key telling them apart. The result is shared between
+        callers, so it should not be modified."""
+        graph = problem.graph
+        function = ALGORITHMS.get(algorithm, algorithm)
+        version = graph.version
+        if self.versions.get(graph, version) != version:
+            self.invalidate(graph)
+        entry = (graph, version, problem.initial, problem.goal, function, type(problem), key)
+        if entry in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(entry)
+            return self.entries[entry]
+        self.misses += 1
+        result = self.entries[entry] = function(problem)
+        self.versions[graph] = version
+        if len(self.entries) > self.maxsize:
+            oldest, _ = self.entries.popitem(last=False)
+            self.evictions += 1
+            if not any(k[0] is oldest[0] for k in self.entries):
+                del self.versions[oldest[0]]
+        return result
+
+    def invalidate(self, graph):
+        """Drop every entry computed on graph."""
+        for key in [k for k in self.entries if k[0] is graph]:
+            del self.entries[key]
+            self.invalidations += 1
+        self.versions.pop(graph, None)
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        self.entries.clear()
+        self.versions.clear()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        """Return the counters and the current size as a Struct."""
+        return Struct(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                      invalidations=self.invalidations, size=len(self.entries),
+                      maxsize=self.maxsize)
+
+    def __len__(self):
+        return len(self.entries)
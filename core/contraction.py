@@ -0,0 +1,211 @@
+"""Contraction hierarchies.
+
+Preprocessing removes ("contracts") the nodes of a graph one at a time, least
+important first. When a node v is contracted, every route u -> v -> w that was
+the only shortest way from u to w is replaced by a shortcut u -> w that
+remembers v as its middle node. The order in which nodes were contracted is
+their rank. Any shortest route can then be found by two small searches that
+only climb in rank: one forward from the start and one backward from the
+goal. Shortcuts are unpacked through their middle nodes to recover the route
+in the original graph."""
+import heapq
+
+from core.graph import fingerprint
+from core.node import Node
+from core.persist import SavedTables
+from core.utils import infinity
+
+
+class ContractionHierarchy(SavedTables):
+    """A contraction hierarchy over a Graph or CompactGraph. witness_limit
+    bounds how many nodes each witness search may settle during
+    preprocessing; a lower limit builds faster but adds a few more
+    (harmless) shortcuts."""
+
+    PARAMETERS = ('witness_limit',)
+    TABLES = ('names', 'rank', 'up', 'down')
+
+    def __init__(self, graph, witness_limit=50):
+        self.graph = graph
+        self.witness_limit = witness_limit
+        self.build()
+
+    def build(self):
+        """(Re)compute node ranks and shortcuts from the current graph."""
+        graph = self.graph
+        self.version = graph.version
+        self.fingerprint = fingerprint(graph)
+        names, index = [], {}
+        for a in graph.nodes():
+            for b in [a] + list(graph.get(a)):
+                if b not in index:
+                    index[b] = len(names)
+                    names.append(b)
+        self.names, self.index = names, index
+        n = len(names)
+
+        # Remaining graph: out[u][w] and into[w][u] are (distance, middle)
+        out = [{} for _ in range(n)]
+        into = [{} for _ in range(n)]
+        for a in graph.nodes():
+            for (b, distance) in graph.get(a).items():
+                i, j = index[a], index[b]
+                if i != j and distance < out[i].get(j, (infinity,))[0]:
+                    out[i][j] = into[j][i] = (distance, None)
+
+        self.rank = [0] * n
+        self.up = [{} for _ in range(n)]    # Links to higher ranked nodes
+        self.down = [{} for _ in range(n)]  # Links from higher ranked nodes
+        deleted_neighbours = [0] * n
+
+        def shortcuts(v):
+            """Return the shortcuts that contracting v would need."""
+            needed = []
+            for (u, (d_in, _)) in into[v].items():
+                targets = {w: d_in + d_out for (w, (d_out, _)) in out[v].items() if w != u}
+                if not targets:
+                    continue
+                witness = self._witness(out, u, v, max(targets.values()))
+                for (w, via) in targets.items():
+                    if witness.get(w, infinity) > via:
+                        needed.append((u, w, via))
+            return needed
+
+        def priority(v):
+            return (len(shortcuts(v)) - len(into[v]) - len(out[v])
+                    + deleted_neighbours[v])
+
+        queue = [(priority(v), v) for v in range(n)]
+        heapq.heapify(queue)
+        rank = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            # Lazy update: contract v only if it is still the least important
+            current = priority(v)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, v))
+                continue
+            for (u, w, via) in shortcuts(v):
+                if via < out[u].get(w, (infinity,))[0]:
+                    out[u][w] = into[w][u] = (via, v)
+            for (w, link) in out[v].items():
+                self.up[v][w] = link
+                del into[w][v]
+                deleted_neighbours[w] += 1
+            for (u, link) in into[v].items():
+                self.down[v][u] = link
+                del out[u][v]
+                deleted_neighbours[u] += 1
+            out[v], into[v] = {}, {}
+            self.rank[v] = rank
+            rank += 1
+
+    def _witness(self, out, source, avoid, limit):
+        """Distances from source in the remaining graph without avoid, up to
+        limit and settling at most witness_limit nodes."""
+        distance = {source: 0}
+        fringe = [(0, source)]
+        settled = 0
+        while fringe and settled < self.witness_limit:
+            d, a = heapq.heappop(fringe)
+            if d > distance.get(a, infinity) or d > limit:
+                continue
+            settled += 1
+            for (b, (length, _)) in out[a].items():
+                if b != avoid and d + length < distance.get(b, infinity):
+                    distance[b] = d + length
+                    heapq.heappush(fringe, (d + length, b))
+        return distance
+
+    def stale(self):
+        """Has the graph changed since the hierarchy was built?"""
+        return self.graph.version != self.version
+
+    def query(self, start, goal):
+        """Return (generated, visited, path_cost, path) for the shortest route
+        from start to goal, where path is a list of Nodes from goal back to
+        start as graph_search returns it, or None if goal is unreachable.
+        Links are (distance, middle) pairs; the backward side climbs the
+        down links of each node, i.e. the original links reversed."""
+        if self.stale():
+            self.build()
+        s, t = self.index.get(start), self.index.get(goal)
+        if s is None or t is None:
+            return None
+        links = (self.up, self.down)
+        distance = ({s: 0}, {t: 0})
+        parent = ({s: None}, {t: None})
+        fringes = ([(0, s)], [(0, t)])
+        generated, visited = 2, 0
+        best, meeting = (0, s) if s == t else (infinity, None)
+        while fringes[0] or fringes[1]:
+            tops = [fringe[0][0] if fringe else infinity for fringe in fringes]
+            if min(tops) >= best:
+                break
+            side = 0 if tops[0] <= tops[1] else 1
+            d, a = heapq.heappop(fringes[side])
+            visited += 1
+            if d > distance[side][a]:
+                continue
+            if a in distance[1 - side] and d + distance[1 - side][a] < best:
+                best, meeting = d + distance[1 - side][a], a
+            for (b, (length, _)) in links[side][a].items():
+                generated += 1
+                if d + length < distance[side].get(b, infinity):
+                    distance[side][b] = d + length
+                    parent[side][b] = a
+                    heapq.heappush(fringes[side], (d + length, b))
+        if meeting is None:
+            return None
+
+        # Chain of hierarchy nodes from start to goal, then unpack shortcuts
+        chain, a = [], meeting
+        while a is not None:
+            chain.append(a)
+            a = parent[0][a]
+        chain.reverse()
+        a = parent[1][meeting]
+        while a is not None:
+            chain.append(a)
+            a = parent[1][a]
+        route = [chain[0]]
+        for (a, b) in zip(chain, chain[1:]):
+            route.extend(self._unpack(a, b))
+
+        node = Node(self.names[route[0]])
+        for b in route[1:]:
+            state = self.names[b]
+            node = Node(state, node, state, node.path_cost + self.graph.get(node.state, state))
+        return generated, visited, node.path_cost, node.path()
+
+    def _link(self, a, b):
+        """Return the (distance, middle) of the hierarchy link from a to b."""
+        if self.rank[a] < self.rank[b]:
+            return self.up[a][b]
+        return self.down[b][a]
+
+    def _unpack(self, a, b):
+        """Return the original nodes after a on the link from a to b."""
+        result, stack = [], [(a, b)]
+        while stack:
+            a, b = stack.pop()
+            middle = self._link(a, b)[1]
+            if middle is None:
+                result.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+        return result
+
+    def shortcut_count(self):
+        """Return the number of shortcuts added by preprocessing."""
+        return sum(middle is not None for links in self.up + self.down
+                   for (_, middle) in links.values())
+
+    @classmethod
+    def open(cls, filename, graph, witness_limit=50):
+        """Return the hierarchy saved in filename if it was built from this
+        same graph with the same witness_limit; otherwise build a new one and
+        save it there. The file is a pickle, so only open files from a
+        trusted source."""
+        return cls._open(filename, graph, witness_limit=witness_limit)
@@ -2,7 +2,18 @@
 # Graphs and Graph Problems
 
 from core.utils import *
+from array import array
+import bisect
+import hashlib
+import heapq
+import json
+import mmap
+import os
 import random
+import struct
+import sys
+
+from core.spatial import GridIndex
 
 
 class Graph:
@@ -17,11 +28,14 @@ class Graph:
     inverse link is also added.  You can use g.nodes() to get a list of nodes,
     g.get('A') to get a dict of links out of A, and g.get('A', 'B') to get the
     length of the link from A to B.  'Lengths' can actually be any object at
-    all, and nodes can be any hashable object."""
+    all, and nodes can be any hashable object. g.version counts the changes
+    made through connect and connect1, so tables derived from the graph can
+    tell when they are stale."""
 
     def __init__(self, dict=None, directed=True):
         self.dict = dict or {}
         self.directed = directed
+        self.version = 0
         if not directed:
             self.make_undirected()
 
@@ -40,6 +54,7 @@ class Graph:
     def connect1(self, A, B, distance):
         """Add a link from A to B of given distance, in one direction only."""
         self.dict.setdefault(A, {})[B] = distance
+        self.version += 1
 
     def get(self, a, b=None):
         """Return a link distance or a dict of {node: distance} entries.
@@ -56,6 +71,39 @@ class Graph:
         return list(self.dict.keys())
 
 
+def fingerprint(graph):
+    """Return a digest of the nodes and links of a graph, for telling whether
+    a table saved to disk was built from this same graph."""
+    digest = hashlib.sha1()
+    for a in graph.nodes():
+        links = graph.get(a)
+        if links:
+            digest.update(repr((a, list(links.items()))).encode())
+    return digest.hexdigest()
+
+
+def dijkstra(graph, source):
+    """Return (distance, first) dicts of the shortest paths from source to
+    every node it reaches: distance[n] is the length of the path to n and
+    first[n] the node the path goes through right after source."""
+    distance, first = {source: 0}, {source: source}
+    fringe = [(0, 0, source)]
+    count = 1
+    closed = set()
+    while fringe:
+        d, _, a = heapq.heappop(fringe)
+        if a in closed:
+            continue
+        closed.add(a)
+        for (b, length) in graph.get(a).items():
+            if b not in distance or d + length < distance[b]:
+                distance[b] = d + length
+                first[b] = b if a == source else first[a]
+                heapq.heappush(fringe, (d + length, count, b))
+                count += 1
+    return distance, first
+
+
 def UndirectedGraph(dict=None):
     """Build a Graph where every edge (including future ones) goes both ways."""
     return Graph(dict=dict, directed=False)
@@ -68,23 +116,390 @@ def RandomGraph(nodes=list(range(10)), min_links=2, width=400, height=300,
     Then each node is connected to the min_links nearest neighbors.
     Because inverse links are added, some nodes will have more connections.
     The distance between nodes is the hypotenuse times curvature(),
-    where curvature() defaults to a random number between 1.1 and 1.5."""
+    where curvature() defaults to a random number between 1.1 and 1.5.
+    Nearest neighbors are found through a GridIndex of the locations, which
+    makes the same choices (and random calls) as scanning every node."""
     g = UndirectedGraph()
     g.locations = {}
     ## Build the cities
     for node in nodes:
         g.locations[node] = (random.randrange(width), random.randrange(height))
+    index = GridIndex([g.locations[node] for node in nodes])
     ## Build roads from each city to at least min_links nearest neighbors.
     for i in range(min_links):
         for node in nodes:
             if len(g.get(node)) < min_links:
                 here = g.locations[node]
+                links = g.get(node)
 
-                def distance_to_node(n):
-                    if n is node or g.get(node, n): return infinity
-                    return distance(g.locations[n], here)
+                def linked(position):
+                    n = nodes[position]
+                    return n is node or links.get(n)
 
-                neighbor = argmin(nodes, distance_to_node)
+                position = index.nearest(here[0], here[1], linked)
+                neighbor = nodes[0 if position is None else position]
                 d = distance(g.locations[neighbor], here) * curvature()
                 g.connect(node, neighbor, int(d))
-    return g
\ No newline at end of file
+    return g
+
+
+def _compact_array(values, typecodes='iqd'):
+    """Return values packed in the narrowest array type among typecodes
+    ('i' and 'q' for integers that fit, 'd' for anything else)."""
+    values = list(values)
+    if all(isinstance(v, int) for v in values):
+        for code in typecodes:
+            if code == 'd':
+                break
+            limit = 2 ** (array(code).itemsize * 8 - 1)
+            if all(-limit <= v < limit for v in values):
+                return array(code, values)
+    return array('d', values)
+
+
+class RangeIndex:
+    """The {name: id} index of a CompactGraph whose names are a range of
+    integers, computed instead of stored."""
+
+    def __init__(self, names):
+        self.names = names
+
+    def get(self, name, default=None):
+        if isinstance(name, int) and name in self.names:
+            return self.names.index(name)
+        return default
+
+    def __getitem__(self, name):
+        i = self.get(name)
+        if i is None:
+            raise KeyError(name)
+        return i
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __len__(self):
+        return len(self.names)
+
+
+class CompactLocations:
+    """Read-only {node: (x, y)} view over the coordinate arrays of a
+    CompactGraph, so code written for Graph.locations keeps working."""
+
+    def __init__(self, graph, xs, ys):
+        self.graph = graph
+        self.xs = xs
+        self.ys = ys
+
+    def __getitem__(self, node):
+        i = self.graph.index[node]
+        return self.xs[i], self.ys[i]
+
+    def __contains__(self, node):
+        return node in self.graph.index
+
+    def __iter__(self):
+        return iter(self.graph.names)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def keys(self):
+        return list(self.graph.names)
+
+    def values(self):
+        return list(zip(self.xs, self.ys))
+
+    def items(self):
+        return list(zip(self.graph.names, self.values()))
+
+
+class CompactGraph:
+    """A frozen graph stored in compressed sparse row (CSR) form. Nodes are
+    numbered 0..n-1 (names[i] is the name of node i, index[name] its id) and
+    the links out of node i are targets[offsets[i]:offsets[i+1]], with the
+    matching weights[] entries. The arrays are plain array.array objects, so
+    an edge costs a few bytes instead of a dict entry per direction.
+
+    With symmetric=True (undirected graphs only) every edge is stored once,
+    in the row of its lower numbered end; each node also keeps a sorted list
+    of the lower numbered neighbours pointing at it (in_offsets/sources), and
+    their weights are found by binary search in those rows.
+
+    The interface mirrors Graph (get, nodes, locations), so a GPSProblem can
+    search a CompactGraph unchanged. Build one with CompactGraph.from_graph
+    or CompactGraph.from_edges; it cannot be modified afterwards. names may
+    be a range (e.g. range(1, n + 1) for DIMACS ids), in which case no
+    per-node index is stored at all."""
+
+    def __init__(self, names, offsets, targets, weights, directed=True,
+                 in_offsets=None, sources=None, xs=None, ys=None):
+        self.names = names
+        if isinstance(names, range):
+            self.index = RangeIndex(names)
+        else:
+            self.index = {name: i for (i, name) in enumerate(names)}
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.directed = directed
+        self.in_offsets = in_offsets
+        self.sources = sources
+        self.symmetric = sources is not None
+        self.version = 0
+        if xs is not None:
+            self.locations = CompactLocations(self, xs, ys)
+
+    @classmethod
+    def from_graph(cls, graph, symmetric=False):
+        """Freeze a Graph (or anything with nodes() and get()) into a
+        CompactGraph, keeping its locations if it has any."""
+        names, index = [], {}
+        for a in graph.nodes():
+            for b in [a] + list(graph.get(a)):
+                if b not in index:
+                    index[b] = len(names)
+                    names.append(b)
+
+        def edges():
+            for a in graph.nodes():
+                for (b, distance) in graph.get(a).items():
+                    yield index[a], index[b], distance
+
+        locations = getattr(graph, 'locations', None) or None
+        return cls.from_edges(names, edges(), directed=graph.directed,
+                              symmetric=symmetric, locations=locations)
+
+    @classmethod
+    def from_edges(cls, names, edges, directed=True, symmetric=False,
+                   locations=None):
+        """Build a CompactGraph from (i, j, distance) triples over node ids
+        0..len(names)-1. For an undirected graph each edge may be given in
+        one or both directions. locations, if given, maps names to (x, y)."""
+        if symmetric and directed:
+            raise ValueError("symmetric storage needs an undirected graph")
+        n = len(names)
+        rows = [{} for _ in range(n)]
+        for (i, j, distance) in edges:
+            if symmetric:
+                i, j = min(i, j), max(i, j)
+            rows[i][j] = distance
+        if symmetric:
+            rows = [sorted(row.items()) for row in rows]
+        else:
+            if not directed:
+                # Add the inverse of every link given in one direction only
+                for i in range(n):
+                    for (j, distance) in list(rows[i].items()):
+                        rows[j].setdefault(i, distance)
+            rows = [list(row.items()) for row in rows]
+
+        offsets = _compact_array(cls._offsets(len(row) for row in rows), 'q')
+        targets = _compact_array((j for row in rows for (j, _) in row), 'iq')
+        weights = _compact_array(distance for row in rows for (_, distance) in row)
+        in_offsets = sources = None
+        if symmetric:
+            lower = [[] for _ in range(n)]
+            for i in range(n):
+                for (j, _) in rows[i]:
+                    if j != i:
+                        lower[j].append(i)
+            in_offsets = _compact_array(cls._offsets(len(row) for row in lower), 'q')
+            sources = _compact_array((i for row in lower for i in row), 'iq')
+        xs = ys = None
+        if locations:
+            xs = array('d', (locations[name][0] for name in names))
+            ys = array('d', (locations[name][1] for name in names))
+        return cls(list(names), offsets, targets, weights, directed,
+                   in_offsets, sources, xs, ys)
+
+    @classmethod
+    def from_arrays(cls, names, sources, targets, weights, directed=True,
+                    xs=None, ys=None):
+        """Build a CompactGraph from parallel arrays of link sources, targets
+        (node ids) and weights with a counting sort, without going through
+        per-node dicts. Links keep their input order within each row and are
+        not deduplicated; an undirected graph gets every link mirrored."""
+        n = len(names)
+        if not directed:
+            sources, targets = sources + targets, targets + sources
+            weights = weights + weights
+        offsets = array('q', [0]) * (n + 1)
+        for i in sources:
+            offsets[i + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        position = offsets[:-1]
+        rows = array('i' if n < 2 ** 31 else 'q', [0]) * len(targets)
+        row_weights = array(weights.typecode, [0]) * len(weights)
+        for k in range(len(sources)):
+            i = sources[k]
+            p = position[i]
+            rows[p] = targets[k]
+            row_weights[p] = weights[k]
+            position[i] = p + 1
+        return cls(names, offsets, rows, row_weights, directed, xs=xs, ys=ys)
+
+    @staticmethod
+    def _offsets(lengths):
+        offsets = [0]
+        for length in lengths:
+            offsets.append(offsets[-1] + length)
+        return offsets
+
+    def links(self, i):
+        """Yield (j, distance) for every link out of node id i."""
+        targets, weights = self.targets, self.weights
+        if self.symmetric:
+            for k in range(self.in_offsets[i], self.in_offsets[i + 1]):
+                yield self.sources[k], self.distance(self.sources[k], i)
+        for k in range(self.offsets[i], self.offsets[i + 1]):
+            yield targets[k], weights[k]
+
+    def distance(self, i, j):
+        """Return the distance of the link between node ids i and j, or None."""
+        if self.symmetric:
+            i, j = min(i, j), max(i, j)
+            lo, hi = self.offsets[i], self.offsets[i + 1]
+            k = bisect.bisect_left(self.targets, j, lo, hi)
+            if k < hi and self.targets[k] == j:
+                return self.weights[k]
+            return None
+        for k in range(self.offsets[i], self.offsets[i + 1]):
+            if self.targets[k] == j:
+                return self.weights[k]
+        return None
+
+    def get(self, a, b=None):
+        """Return a link distance or a dict of {node: distance} entries, as
+        Graph.get does."""
+        i = self.index.get(a)
+        if i is None:
+            return {} if b is None else None
+        if b is None:
+            names = self.names
+            return {names[j]: distance for (j, distance) in self.links(i)}
+        j = self.index.get(b)
+        return None if j is None else self.distance(i, j)
+
+    def nodes(self):
+        """Return a list of nodes in the graph."""
+        return list(self.names)
+
+    def edge_count(self):
+        """Return the number of stored links (undirected edges count once
+        with symmetric storage, twice otherwise)."""
+        return len(self.targets)
+
+    def connect(self, A, B, distance=1):
+        raise TypeError("CompactGraph is frozen; rebuild it from a Graph")
+
+    connect1 = connect
+
+
+# ______________________________________________________________________________
+# Binary graph files
+
+GRAPH_MAGIC = b'FSIGRAPH'
+GRAPH_FORMAT = 1  # Version of the layout written by save_compact_graph
+_HEADER = struct.Struct('<8sII')  # magic, format version, header length
+_ARRAYS = ('offsets', 'targets', 'weights', 'in_offsets', 'sources')
+
+
+def _typecode(a):
+    return a.typecode if isinstance(a, array) else a.format
+
+
+def _encode_name(name):
+    """Return a node name as JSON data that _decode_name turns back into an
+    equal name: strings, numbers, booleans and None as they are, tuples of
+    those (nested too) as {"tuple": [...]}."""
+    if name is None or type(name) in (str, int, float, bool):
+        return name
+    if type(name) is tuple:
+        return {'tuple': [_encode_name(item) for item in name]}
+    raise ValueError("cannot store node name %r in a graph file" % (name,))
+
+
+def _decode_name(data):
+    if isinstance(data, dict):
+        return tuple(_decode_name(item) for item in data['tuple'])
+    return data
+
+
+def save_compact_graph(graph, filename, heuristics=None):
+    """Write a CompactGraph to filename in a binary layout that
+    open_compact_graph can map straight into memory: a fixed header, a JSON
+    description of the graph, then every array 8-byte aligned. heuristics may
+    map names to per-node tables (sequences of n floats, e.g. landmark
+    distances) to be stored alongside. Node names must be strings, numbers,
+    booleans, None or tuples of those; any other name raises ValueError."""
+    sections = [(key, getattr(graph, key)) for key in _ARRAYS
+                if getattr(graph, key, None) is not None]
+    if hasattr(graph, 'locations'):
+        sections += [('xs', graph.locations.xs), ('ys', graph.locations.ys)]
+    for (name, table) in (heuristics or {}).items():
+        table = table if isinstance(table, (array, memoryview)) else array('d', table)
+        sections.append(('heuristic:' + name, table))
+
+    names = graph.names
+    if isinstance(names, range):
+        names = {'range': [names.start, names.stop, names.step]}
+    else:
+        names = [_encode_name(name) for name in names]
+    description = {'directed': graph.directed, 'byteorder': sys.byteorder,
+                   'names': names, 'arrays': {}}
+    start = 0
+    for (key, a) in sections:
+        size = len(a) * a.itemsize
+        description['arrays'][key] = [start, len(a), _typecode(a)]
+        start += (size + 7) // 8 * 8
+    header = json.dumps(description).encode()
+    header += b' ' * (-(_HEADER.size + len(header)) % 8)
+
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(GRAPH_MAGIC, GRAPH_FORMAT, len(header)))
+        f.write(header)
+        for (_, a) in sections:
+            data = memoryview(a).cast('B')
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 8))
+
+
+def open_compact_graph(filename):
+    """Map a file written by save_compact_graph and return it as a
+    CompactGraph whose arrays are views on the mapped pages, so opening is
+    almost instant and processes opening the same file share its memory.
+    Stored heuristic tables are in graph.heuristics."""
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            raise ValueError("%s is not a version %d graph file" % (filename, GRAPH_FORMAT))
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, length = _HEADER.unpack_from(data)
+    if magic != GRAPH_MAGIC or version != GRAPH_FORMAT:
+        data.close()
+        raise ValueError("%s is not a version %d graph file" % (filename, GRAPH_FORMAT))
+    description = json.loads(bytes(data[_HEADER.size:_HEADER.size + length]))
+    if description['byteorder'] != sys.byteorder:
+        data.close()
+        raise ValueError("%s was written on a %s-endian machine" % (filename, description['byteorder']))
+
+    base = _HEADER.size + length
+    view = memoryview(data)
+    arrays = {}
+    for (key, (start, count, typecode)) in description['arrays'].items():
+        size = count * array(typecode).itemsize
+        arrays[key] = view[base + start:base + start + size].cast(typecode)
+
+    names = description['names']
+    if isinstance(names, dict):
+        names = range(*names['range'])
+    else:
+        names = [_decode_name(name) for name in names]
+    graph = CompactGraph(names, arrays['offsets'], arrays['targets'], arrays['weights'],
+                         description['directed'], arrays.get('in_offsets'),
+                         arrays.get('sources'), arrays.get('xs'), arrays.get('ys'))
+    graph.heuristics = {key[len('heuristic:'):]: a for (key, a) in arrays.items()
+                        if key.startswith('heuristic:')}
+    graph.mapping = data  # Keeps the file mapped as long as the graph lives
+    return graph
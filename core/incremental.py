@@ -0,0 +1,141 @@
+"""Incremental re-planning with Lifelong Planning A* (LPA*).
+
+An LPAStar planner keeps, for one GPSProblem, the cost g(s) of every state
+it settled and a one-step lookahead rhs(s) = min over predecessors p of
+g(p) + cost(p, s). States where the two disagree are kept in a priority
+queue ordered by (min(g, rhs) + h, min(g, rhs)). When a link changes only
+its end states get a new rhs, and the next plan() settles just the states
+whose cost actually changed, instead of searching again from scratch."""
+import heapq
+import itertools
+
+from core.node import Node
+from core.utils import infinity
+
+
+class LPAStar:
+    """Lifelong Planning A* for a GPSProblem. Change links with update_edge
+    and call plan() again for the repaired route. With underestimation the
+    queue keys add problem.h, which must be consistent for the routes to be
+    optimal. A change made to the graph behind the planner's back (seen as
+    an unexpected graph.version) makes the next plan() start over."""
+
+    def __init__(self, problem, underestimation=True):
+        self.problem = problem
+        self.graph = problem.graph
+        self.underestimation = underestimation
+        self.reset()
+
+    def reset(self):
+        """Forget every settled state and the predecessor lists."""
+        graph, start = self.graph, self.problem.initial
+        self.version = graph.version
+        self.predecessors = None
+        if graph.directed:
+            self.predecessors = {}
+            for a in graph.nodes():
+                for b in graph.get(a):
+                    self.predecessors.setdefault(b, set()).add(a)
+        self.g, self.rhs, self.hs = {}, {start: 0}, {}
+        self.queue, self.queued, self.counter = [], {}, itertools.count()
+        self.push(start)
+
+    def h(self, state):
+        if not self.underestimation:
+            return 0
+        h = self.hs.get(state)
+        if h is None:
+            h = self.hs[state] = self.problem.h(Node(state))
+        return h
+
+    def cost(self, a, b):
+        return self.problem.path_cost(0, a, b, b)
+
+    def key(self, state):
+        best = min(self.g.get(state, infinity), self.rhs.get(state, infinity))
+        return (best + self.h(state), best)
+
+    def push(self, state):
+        key = self.queued[state] = self.key(state)
+        heapq.heappush(self.queue, (key, next(self.counter), state))
+
+    def top_key(self):
+        """Return the smallest key in the queue, dropping outdated entries."""
+        queue = self.queue
+        while queue and self.queued.get(queue[0][2]) != queue[0][0]:
+            heapq.heappop(queue)
+        return queue[0][0] if queue else (infinity, infinity)
+
+    def predecessors_of(self, state):
+        if self.predecessors is None:
+            return self.graph.get(state)
+        return self.predecessors.get(state, ())
+
+    def update_state(self, state):
+        """Recompute rhs(state) and (un)queue state as it became (in)consistent."""
+        if state != self.problem.initial:
+            g = self.g
+            self.rhs[state] = min((g.get(p, infinity) + self.cost(p, state)
+                                   for p in self.predecessors_of(state)), default=infinity)
+        self.queued.pop(state, None)
+        if self.g.get(state, infinity) != self.rhs.get(state, infinity):
+            self.push(state)
+
+    def update_edge(self, a, b, cost):
+        """Set the link from a to b (both ways on an undirected graph) to
+        cost with graph.connect, and record what it invalidates."""
+        graph = self.graph
+        expected = graph.version == self.version
+        graph.connect(a, b, cost)
+        if not expected:
+            return  # plan() starts over anyway
+        self.version = graph.version
+        if self.predecessors is not None:
+            self.predecessors.setdefault(b, set()).add(a)
+        self.update_state(b)
+        if not graph.directed:
+            self.update_state(a)
+
+    def plan(self):
+        """Return (generated, visited, path_cost, path) like graph_search,
+        where generated counts the queue pushes and visited the states
+        settled by this call, or None if the goal cannot be reached."""
+        if self.graph.version != self.version:
+            self.reset()
+        goal, g, rhs = self.problem.goal, self.g, self.rhs
+        pushes = next(self.counter)
+        visited = 0
+        while (self.top_key() < self.key(goal)
+               or rhs.get(goal, infinity) != g.get(goal, infinity)):
+            if not self.queue:
+                break
+            _, _, state = heapq.heappop(self.queue)
+            del self.queued[state]
+            visited += 1
+            if g.get(state, infinity) > rhs.get(state, infinity):
+                g[state] = rhs[state]
+                for successor in self.graph.get(state):
+                    self.update_state(successor)
+            else:
+                g[state] = infinity
+                for successor in self.graph.get(state):
+                    self.update_state(successor)
+                self.update_state(state)
+        generated = next(self.counter) - pushes - 1
+        if g.get(goal, infinity) == infinity:
+            return None
+        return generated, visited, g[goal], self.route()
+
+    def route(self):
+        """Return the path to the goal as a list of Nodes, goal first, by
+        walking back through the cheapest predecessors."""
+        problem, g = self.problem, self.g
+        states = [problem.goal]
+        while states[-1] != problem.initial:
+            state = states[-1]
+            states.append(min(self.predecessors_of(state),
+                              key=lambda p: g.get(p, infinity) + self.cost(p, state)))
+        node = Node(problem.initial)
+        for state in reversed(states[:-1]):
+            node = Node(state, node, state, problem.path_cost(node.path_cost, node.state, state, state))
+        return node.path()
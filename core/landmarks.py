@@ -0,0 +1,115 @@
+"""Landmark (ALT) lower bounds for route searches.
+
+A few landmark nodes are picked far apart from each other and the shortest
+distances from and to each of them are stored for every node. By the triangle
+inequality, for any landmark L
+
+    d(a, b) >= d(L, b) - d(L, a)    and    d(a, b) >= d(a, L) - d(b, L)
+
+so the largest of these differences is an admissible and consistent estimate
+of the remaining cost. Unlike the straight-line distance it needs no
+coordinates, and it follows the real road costs much more closely."""
+import random
+from array import array
+
+from core.graph import Graph, dijkstra, fingerprint
+from core.persist import SavedTables
+from core.problem import GPSProblem
+from core.utils import infinity
+
+
+def reverse_graph(graph):
+    """Return a Graph with every link of graph turned around."""
+    reverse = Graph()
+    for a in graph.nodes():
+        for (b, distance) in graph.get(a).items():
+            reverse.connect1(b, a, distance)
+    return reverse
+
+
+class Landmarks(SavedTables):
+    """Distances from and to k landmarks of a Graph or CompactGraph. The
+    landmarks are chosen greedily: each new one is the node farthest from
+    those already picked, starting from a node picked with random(seed)."""
+
+    PARAMETERS = ('k', 'seed')
+    TABLES = ('names', 'landmarks', 'from_landmark', 'to_landmark')
+
+    def __init__(self, graph, k=4, seed=None):
+        self.graph = graph
+        self.k = k
+        self.seed = seed
+        self.build()
+
+    def build(self):
+        """(Re)pick the landmarks and compute their distance tables."""
+        graph = self.graph
+        self.version = graph.version
+        self.fingerprint = fingerprint(graph)
+        self.names = graph.nodes()
+        self.index = {name: i for (i, name) in enumerate(self.names)}
+        reverse = reverse_graph(graph) if graph.directed else graph
+        self.landmarks, self.from_landmark, self.to_landmark = [], [], []
+        if not self.names:
+            return
+        # Distance from the landmarks picked so far (from the start node at first)
+        start = random.Random(self.seed).choice(self.names)
+        closest = dijkstra(graph, start)[0]
+        for _ in range(min(self.k, len(self.names))):
+            candidates = [n for n in closest if n not in self.landmarks]
+            if not candidates:
+                break
+            landmark = max(candidates, key=closest.get)
+            self.landmarks.append(landmark)
+            forward = dijkstra(graph, landmark)[0]
+            self.from_landmark.append(self._table(forward))
+            self.to_landmark.append(self._table(dijkstra(reverse, landmark)[0]))
+            for (name, d) in forward.items():
+                closest[name] = min(closest[name], d)
+
+    def _table(self, distances):
+        table = array('d', [infinity]) * len(self.names)
+        for (name, d) in distances.items():
+            if name in self.index:
+                table[self.index[name]] = d
+        return table
+
+    def stale(self):
+        """Has the graph changed since the tables were built?"""
+        return self.graph.version != self.version
+
+    def lower_bound(self, a, b):
+        """Return a lower bound on the distance from a to b."""
+        if self.stale():
+            self.build()
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None:
+            return 0
+        bound = 0
+        for (forward, backward) in zip(self.from_landmark, self.to_landmark):
+            if forward[i] < infinity and forward[j] < infinity:
+                bound = max(bound, forward[j] - forward[i])
+            if backward[i] < infinity and backward[j] < infinity:
+                bound = max(bound, backward[i] - backward[j])
+        return bound
+
+    @classmethod
+    def open(cls, filename, graph, k=4, seed=None):
+        """Return the landmarks saved in filename if they were built from this
+        same graph with the same k and seed; otherwise build new ones and save
+        them there. The file is a pickle, so only open files from a trusted
+        source."""
+        return cls._open(filename, graph, k=k, seed=seed)
+
+
+class ALTProblem(GPSProblem):
+    """A GPSProblem whose h is the landmark lower bound to the goal, so
+    branch_and_bound_underestimation works with or without locations."""
+
+    def __init__(self, initial, goal, graph, landmarks):
+        GPSProblem.__init__(self, initial, goal, graph)
+        self.landmarks = landmarks
+
+    def h(self, node):
+        """h function is the best landmark lower bound from node to goal."""
+        return self.landmarks.lower_bound(node.state, self.goal)
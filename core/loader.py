@@ -0,0 +1,171 @@
+"""Streaming loaders for road networks stored as text.
+
+Supported formats:
+    DIMACS shortest path files (9th DIMACS challenge): a .gr file with one
+    'a u v w' line per arc and an optional .co file with one 'v id x y' line
+    per node. Node ids run from 1 to n.
+    Edge lists: one 'source,target,weight' line per edge (any delimiter, an
+    optional header line), with an optional 'node,x,y' file of locations.
+
+Files are memory-mapped and parsed a chunk of lines at a time, so the text is
+never held in memory as a whole. With compact=True the links are gathered in
+flat arrays and turned into a CompactGraph; otherwise a Graph is filled in."""
+import mmap
+from array import array
+
+from core.graph import CompactGraph, Graph
+
+CHUNK_SIZE = 1 << 24  # Bytes of text parsed at a time
+
+
+def read_lines(filename, chunk_size=CHUNK_SIZE):
+    """Yield the lines of a file (as bytes, without line endings), reading it
+    through mmap one chunk at a time."""
+    with open(filename, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            return
+        with data:
+            start, size = 0, len(data)
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    # Stop the chunk after its last complete line
+                    newline = data.rfind(b'\n', start, end)
+                    if newline < 0:
+                        newline = data.find(b'\n', end)
+                    end = size if newline < 0 else newline + 1
+                yield from data[start:end].splitlines()
+                start = end
+
+
+def _number(token):
+    try:
+        return int(token)
+    except ValueError:
+        return float(token)
+
+
+def _name(token):
+    """Turn a node field into an int if it looks like one, else a str."""
+    token = token.strip().decode()
+    return int(token) if token.lstrip('-').isdigit() else token
+
+
+class _Links:
+    """Collects links either into a Graph or into flat arrays."""
+
+    def __init__(self, compact, directed):
+        self.compact = compact
+        self.directed = directed
+        if compact:
+            self.sources, self.targets = array('q'), array('q')
+            self.weights = array('q')
+        else:
+            self.graph = Graph(directed=directed)
+
+    def add(self, i, j, a, b, distance):
+        """Add a link between node ids i, j (named a, b)."""
+        if not self.compact:
+            self.graph.connect(a, b, distance)
+            return
+        if isinstance(distance, float) and self.weights.typecode != 'd':
+            self.weights = array('d', self.weights)
+        self.sources.append(i)
+        self.targets.append(j)
+        self.weights.append(distance)
+
+
+def load_dimacs(gr_filename, co_filename=None, compact=True, directed=True):
+    """Load a DIMACS .gr graph (and .co coordinates) into a CompactGraph, or
+    a Graph if compact is False. Nodes are named by their DIMACS ids. DIMACS
+    road networks list every road in both directions, so they load as
+    directed graphs by default."""
+    n = 0
+    links = _Links(compact, directed)
+    for line in read_lines(gr_filename):
+        kind = line[:1]
+        if kind == b'a':
+            _, u, v, w = line.split()
+            u, v = int(u), int(v)
+            n = max(n, u, v)
+            links.add(u - 1, v - 1, u, v, _number(w))
+        elif kind == b'p':
+            n = max(n, int(line.split()[2]))
+
+    xs = ys = None
+    if co_filename:
+        xs, ys = array('d', [0]) * n, array('d', [0]) * n
+        for line in read_lines(co_filename):
+            if line[:1] == b'v':
+                _, i, x, y = line.split()
+                xs[int(i) - 1], ys[int(i) - 1] = _number(x), _number(y)
+
+    if not compact:
+        graph = links.graph
+        for node in range(1, n + 1):
+            graph.dict.setdefault(node, {})
+        if xs is not None:
+            graph.locations = {i + 1: (xs[i], ys[i]) for i in range(n)}
+        return graph
+    return CompactGraph.from_arrays(range(1, n + 1), links.sources, links.targets,
+                                    links.weights, directed, xs, ys)
+
+
+def load_edge_list(filename, locations_filename=None, delimiter=',',
+                   compact=False, directed=False):
+    """Load 'source,target,weight' lines into a Graph, or a CompactGraph if
+    compact is True. A first line whose weight is not a number is taken as a
+    header and skipped. locations_filename, if given, holds 'node,x,y'
+    lines; a CompactGraph needs one for every node, and ValueError names the
+    first node without one. Edge lists are undirected unless directed is
+    True."""
+    separator = delimiter.encode()
+    names, index = [], {}
+    links = _Links(compact, directed)
+
+    def node_id(token):
+        name = _name(token)
+        i = index.get(name)
+        if i is None:
+            i = index[name] = len(names)
+            names.append(name)
+        return i, name
+
+    for (number, line) in enumerate(read_lines(filename)):
+        fields = line.split(separator)
+        if len(fields) < 3:
+            continue
+        try:
+            distance = _number(fields[2])
+        except ValueError:
+            if number == 0:
+                continue  # Header
+            raise
+        (i, a), (j, b) = node_id(fields[0]), node_id(fields[1])
+        links.add(i, j, a, b, distance)
+
+    locations = {}
+    if locations_filename:
+        for (number, line) in enumerate(read_lines(locations_filename)):
+            fields = line.split(separator)
+            try:
+                locations[_name(fields[0])] = (_number(fields[1]), _number(fields[2]))
+            except (ValueError, IndexError):
+                if number != 0:
+                    raise
+
+    if not compact:
+        if locations:
+            links.graph.locations = locations
+        return links.graph
+    xs = ys = None
+    if locations:
+        missing = next((name for name in names if name not in locations), None)
+        if missing is not None:
+            raise ValueError("%s has no location for node %r" % (locations_filename, missing))
+        xs = array('d', (locations[name][0] for name in names))
+        ys = array('d', (locations[name][1] for name in names))
+    return CompactGraph.from_arrays(names, links.sources, links.targets, links.weights,
+                                    directed, xs, ys)
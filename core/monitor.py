@@ -0,0 +1,122 @@
+"""Telemetry for graph_search.
+
+Passing a SearchMonitor as graph_search(..., monitor=m) runs the search in
+a separate instrumented loop that times each phase (popping the fringe,
+goal tests, expanding nodes and pushing the successors), tracks the peak
+fringe and closed set sizes, and calls the on_pop, on_expand and on_goal
+hooks. Without a monitor graph_search runs its plain loop, so the telemetry
+costs nothing when it is not asked for. Subclass SearchMonitor and
+override the hooks to watch a search as it runs.
+
+A MemoryMonitor also traces allocations with tracemalloc, and
+memory_report(search, problem) returns a search result together with how
+much memory the search took."""
+import tracemalloc
+
+PHASES = ('pop', 'goal_test', 'expand', 'push')
+
+
+class SearchMonitor:
+    """Counters and phase timers of the last search run with this monitor.
+    timers holds the seconds spent in each of PHASES and elapsed the whole
+    run, hooks included."""
+
+    def __init__(self):
+        self.problem = None
+        self.reset()
+
+    def start(self, problem):
+        """Called when a search of problem begins."""
+        self.problem = problem
+        self.reset()
+
+    def reset(self):
+        """Zero the counters and timers."""
+        self.timers = dict.fromkeys(PHASES, 0.0)
+        self.generated = self.visited = self.expansions = 0
+        self.peak_fringe = self.peak_closed = 0
+        self.elapsed = 0.0
+        self.result = None
+
+    def on_pop(self, node):
+        """Called with every node taken from the fringe."""
+
+    def on_expand(self, node, successors):
+        """Called after node was expanded and successors pushed."""
+
+    def on_goal(self, node):
+        """Called with the goal node, just before the search returns."""
+
+    def finish(self, generated, visited, elapsed, fringe, closed, result):
+        """Record the totals; called when the search ends, with the live
+        fringe and closed set."""
+        self.generated, self.visited, self.elapsed = generated, visited, elapsed
+        self.result = result
+
+    def expansions_per_second(self):
+        return self.expansions / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        """Return the metrics of the last run as a dict."""
+        return {'generated': self.generated, 'visited': self.visited,
+                'expansions': self.expansions, 'peak_fringe': self.peak_fringe,
+                'peak_closed': self.peak_closed, 'elapsed': self.elapsed,
+                'expansions_per_second': self.expansions_per_second(),
+                'timers': dict(self.timers)}
+
+
+class MemoryMonitor(SearchMonitor):
+    """SearchMonitor that also records the peak memory traced by tracemalloc
+    during the search (above what was allocated when it started), and what
+    is still alive when it ends: the nodes in the fringe, the states in the
+    closed set and the distinct nodes on their parent chains. tracemalloc
+    slows every allocation down, so the phase timers of a MemoryMonitor are
+    not comparable to those of a plain SearchMonitor."""
+
+    def reset(self):
+        SearchMonitor.reset(self)
+        self.peak_bytes = self.fringe_nodes = self.closed_states = self.tree_nodes = 0
+
+    def start(self, problem):
+        SearchMonitor.start(self, problem)
+        self.tracing = not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+
+    def finish(self, generated, visited, elapsed, fringe, closed, result):
+        self.peak_bytes = max(tracemalloc.get_traced_memory()[1] - self.baseline, 0)
+        if self.tracing:
+            tracemalloc.stop()
+        SearchMonitor.finish(self, generated, visited, elapsed, fringe, closed, result)
+        self.fringe_nodes = len(fringe)
+        self.closed_states = len(closed)
+        # Every node still reachable from the fringe or the returned path
+        seen = set()
+        roots = list(fringe) + (result[3][:1] if result else [])
+        for node in roots:
+            while node is not None and id(node) not in seen:
+                seen.add(id(node))
+                node = node.parent
+        self.tree_nodes = len(seen)
+
+    def bytes_per_node(self):
+        """Peak traced bytes per generated node."""
+        return self.peak_bytes / self.generated if self.generated else 0.0
+
+    def report(self):
+        report = SearchMonitor.report(self)
+        report.update(peak_bytes=self.peak_bytes, fringe_nodes=self.fringe_nodes,
+                      closed_states=self.closed_states, tree_nodes=self.tree_nodes,
+                      bytes_per_node=self.bytes_per_node())
+        return report
+
+
+def memory_report(search, problem, **options):
+    """Run search(problem, **options) under a MemoryMonitor and return
+    (result, report), where result is what search returned and report the
+    MemoryMonitor.report() of the run."""
+    monitor = MemoryMonitor()
+    result = search(problem, monitor=monitor, **options)
+    return result, monitor.report()
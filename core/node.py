@@ -1,4 +1,5 @@
 from core.utils import *
+from array import array
 
 
 class Node:
@@ -6,17 +7,20 @@ class Node:
     that this is a successor of) and to the actual state for this node. Note
     that if a state is arrived at by two paths, then there are two nodes with
     the same state.  Also includes the action that got us to this state, and
-    the total path_cost (also known as g) to reach the node.  Other functions
-    may add an f and h value; see best_first_graph_search and astar_search for
-    an explanation of how the f and h values are handled. You will not need to
-    subclass this class."""
+    the total path_cost (also known as g) to reach the node. Nodes are
+    allocated for every generated successor, so they use __slots__ instead of
+    an instance dict; keep any other per-node values (like f or h) outside
+    the node. You will not need to subclass this class."""
+
+    __slots__ = ('state', 'parent', 'action', 'path_cost', 'depth')
 
     def __init__(self, state, parent=None, action=None, path_cost=0):
         """Create a search tree Node, derived from a parent by an action."""
-        update(self, state=state, parent=parent, action=action,
-               path_cost=path_cost, depth=0)
-        if parent:
-            self.depth = parent.depth + 1
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.path_cost = path_cost
+        self.depth = parent.depth + 1 if parent else 0
 
     def __repr__(self):
         return "<Node %s>" % (self.state,)
@@ -43,3 +47,112 @@ class Node:
                      problem.path_cost(self.path_cost, self.state, act, next)
                      )
                 for (act, next) in problem.successor(self.state)]
+
+
+class NodeArena:
+    """A whole search tree stored as rows of preallocated parallel arrays
+    (state id, parent row, action, path_cost, depth) instead of one Node
+    object per node. Rows are numbered from 0 and the root's parent is -1;
+    each distinct state is stored once and rows refer to it by id. Path
+    costs are kept as floats. The arrays double in size when they fill up."""
+
+    def __init__(self, capacity=1024):
+        self.states = []       # Distinct states; rows hold their index here
+        self.state_ids = {}
+        self.state = array('q', [0]) * capacity
+        self.parent = array('q', [0]) * capacity
+        self.action = [None] * capacity
+        self.path_cost = array('d', [0]) * capacity
+        self.depth = array('l', [0]) * capacity
+        self.size = 0
+        self.cursor = NodeView(self)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        for column in (self.state, self.parent, self.action, self.path_cost, self.depth):
+            column.extend(column)
+
+    def add(self, state, parent=-1, action=None, path_cost=0):
+        """Store a new node and return its row."""
+        if self.size == len(self.parent):
+            self._grow()
+        i = self.size
+        state_id = self.state_ids.get(state)
+        if state_id is None:
+            state_id = self.state_ids[state] = len(self.states)
+            self.states.append(state)
+        self.state[i] = state_id
+        self.parent[i] = parent
+        self.action[i] = action
+        self.path_cost[i] = path_cost
+        self.depth[i] = self.depth[parent] + 1 if parent >= 0 else 0
+        self.size += 1
+        return i
+
+    def state_of(self, i):
+        """Return the state of row i."""
+        return self.states[self.state[i]]
+
+    def expand(self, i, problem):
+        """Return the rows of the nodes reachable from row i, like Node.expand."""
+        state, cost = self.states[self.state[i]], self.path_cost[i]
+        return [self.add(next, i, act, problem.path_cost(cost, state, act, next))
+                for (act, next) in problem.successor(state)]
+
+    def view(self, i):
+        """Return a node-like view of row i, with the attributes of a Node.
+        The same view object is reused on every call, so read it right away;
+        it lets code written for Nodes (like sort functions) read rows without
+        allocating anything."""
+        self.cursor.i = i
+        return self.cursor
+
+    def node(self, i):
+        """Build a real Node (with its parent chain) for row i."""
+        return self.path(i)[0]
+
+    def path(self, i):
+        """Return the list of Nodes from row i back to the root, like Node.path."""
+        rows = []
+        while i >= 0:
+            rows.append(i)
+            i = self.parent[i]
+        node = None
+        for i in reversed(rows):
+            node = Node(self.state_of(i), node, self.action[i], self.path_cost[i])
+        return node.path()
+
+
+class NodeView:
+    """Node-like read-only window onto one row of a NodeArena."""
+
+    __slots__ = ('arena', 'i')
+
+    def __init__(self, arena, i=0):
+        self.arena = arena
+        self.i = i
+
+    @property
+    def state(self):
+        return self.arena.state_of(self.i)
+
+    @property
+    def parent(self):
+        return self.arena.parent[self.i]
+
+    @property
+    def action(self):
+        return self.arena.action[self.i]
+
+    @property
+    def path_cost(self):
+        return self.arena.path_cost[self.i]
+
+    @property
+    def depth(self):
+        return self.arena.depth[self.i]
+
+    def __repr__(self):
+        return "<Node %s>" % (self.state,)
@@ -0,0 +1,79 @@
+"""Precomputed all-pairs shortest path tables.
+
+A DistanceOracle runs Dijkstra once from every node of a graph and keeps two
+n x n tables: the distance from i to j and the next node on the way from i to
+j. Cost queries are then a single lookup and path queries take one lookup per
+step. The tables can be saved to a file and reopened later; they are rebuilt
+whenever the graph they came from has changed."""
+from array import array
+
+from core.graph import dijkstra, fingerprint
+from core.persist import SavedTables
+from core.utils import infinity
+
+
+class DistanceOracle(SavedTables):
+    """All-pairs distance and next-hop tables for a Graph or CompactGraph."""
+
+    TABLES = ('names', 'distances', 'next_hops')
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.build()
+
+    def build(self):
+        """(Re)compute the tables from the current state of the graph."""
+        graph = self.graph
+        self.version = graph.version
+        self.fingerprint = fingerprint(graph)
+        self.names = graph.nodes()
+        self.index = {name: i for (i, name) in enumerate(self.names)}
+        for a in list(self.names):
+            for b in graph.get(a):
+                if b not in self.index:
+                    self.index[b] = len(self.names)
+                    self.names.append(b)
+        n = len(self.names)
+        self.distances = array('d', [infinity]) * (n * n)
+        self.next_hops = array('i', [-1]) * (n * n)
+        for (i, source) in enumerate(self.names):
+            distance, first = dijkstra(graph, source)
+            row = i * n
+            for (b, d) in distance.items():
+                j = self.index[b]
+                self.distances[row + j] = d
+                self.next_hops[row + j] = self.index[first[b]]
+
+    def stale(self):
+        """Has the graph changed since the tables were built?"""
+        return self.graph.version != self.version
+
+    def _ids(self, a, b):
+        if self.stale():
+            self.build()
+        return self.index[a], self.index[b]
+
+    def distance(self, a, b):
+        """Return the shortest distance from a to b (infinity if unreachable)."""
+        i, j = self._ids(a, b)
+        return self.distances[i * len(self.names) + j]
+
+    def path(self, a, b):
+        """Return the list of nodes on a shortest path from a to b, both ends
+        included, or None if b cannot be reached from a."""
+        i, j = self._ids(a, b)
+        n = len(self.names)
+        if self.next_hops[i * n + j] < 0:
+            return None
+        path = [self.names[i]]
+        while i != j:
+            i = self.next_hops[i * n + j]
+            path.append(self.names[i])
+        return path
+
+    @classmethod
+    def open(cls, filename, graph):
+        """Return the oracle saved in filename if it was built from this same
+        graph; otherwise build a new one and save it there. The file is a
+        pickle, so only open files from a trusted source."""
+        return cls._open(filename, graph)
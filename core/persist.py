@@ -0,0 +1,59 @@
+"""Tables computed from a graph that can be saved to a file and reopened.
+
+DistanceOracle, Landmarks and ContractionHierarchy all spend a while
+precomputing tables over a graph. SavedTables gives them one way of writing
+those tables to disk and of loading them back only when they were built from
+the same graph (compared by fingerprint) with the same parameters; anything
+else makes them be built again and saved over the old file.
+
+The files are pickles. Loading a pickle can run arbitrary code, so only open
+files that you wrote yourself or otherwise trust."""
+import pickle
+
+from core.graph import fingerprint
+
+
+class SavedTables:
+    """Mixin for classes built as cls(graph, **parameters) that keep graph,
+    version, fingerprint, names and index attributes. FORMAT is the version
+    of the file layout, PARAMETERS the names of the constructor arguments a
+    saved file must have been built with, and TABLES the attributes written
+    next to them."""
+
+    FORMAT = 1
+    PARAMETERS = ()
+    TABLES = ()
+
+    def save(self, filename):
+        """Write the tables to filename."""
+        data = {'format': self.FORMAT, 'fingerprint': self.fingerprint}
+        for name in self.PARAMETERS + self.TABLES:
+            data[name] = getattr(self, name)
+        with open(filename, 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def _open(cls, filename, graph, **parameters):
+        """Return the tables saved in filename if they were built from this
+        same graph with these parameters; otherwise build them with
+        cls(graph, **parameters) and save them there. filename is unpickled,
+        so it must come from a trusted source."""
+        try:
+            with open(filename, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            data = None
+        if (not isinstance(data, dict) or data.get('format') != cls.FORMAT
+                or data.get('fingerprint') != fingerprint(graph)
+                or any(data.get(name) != value for (name, value) in parameters.items())):
+            tables = cls(graph, **parameters)
+            tables.save(filename)
+            return tables
+        tables = cls.__new__(cls)
+        tables.graph = graph
+        tables.version = graph.version
+        tables.fingerprint = data['fingerprint']
+        for name in cls.PARAMETERS + cls.TABLES:
+            setattr(tables, name, data[name])
+        tables.index = {name: i for (i, name) in enumerate(tables.names)}
+        return tables
@@ -1,4 +1,43 @@
 from core.utils import *
+import weakref
+
+# Straight-line distance tables, cached as {graph: {goal: (owner, table)}}
+# where owner identifies the locations the table was computed from
+_heuristic_tables = weakref.WeakKeyDictionary()
+
+
+def _owner(locs):
+    """Return what a cached table keeps to recognise locs by: a weak reference
+    when locs allows one, since CompactLocations refers back to its graph and
+    would keep the cache entry alive for good, or else locs itself."""
+    try:
+        return weakref.ref(locs)
+    except TypeError:
+        return locs
+
+
+def heuristic_table(graph, goal):
+    """Return {node: int(straight-line distance from node to goal)} for every
+    node in graph.locations, or None if the graph has no locations. Tables are
+    computed in one pass over the coordinates and cached per (graph, goal);
+    assigning a new graph.locations makes them be computed again."""
+    locs = getattr(graph, 'locations', None)
+    if not locs:
+        return None
+    tables = _heuristic_tables.setdefault(graph, {})
+    cached = tables.get(goal)
+    if cached is not None:
+        owner = cached[0]
+        if isinstance(owner, weakref.ref):
+            owner = owner()
+        if owner is not locs or len(cached[1]) != len(locs):
+            cached = None
+    if cached is None:
+        gx, gy = locs[goal]
+        hypot = math.hypot
+        table = {n: int(hypot(x - gx, y - gy)) for (n, (x, y)) in locs.items()}
+        cached = tables[goal] = (_owner(locs), table)
+    return cached[1]
 
 class Problem:
     """The abstract class for a formal problem.  You should subclass this and
@@ -46,6 +85,7 @@ class GPSProblem(Problem):
     def __init__(self, initial, goal, graph):
         Problem.__init__(self, initial, goal)
         self.graph = graph
+        self.h_goal, self.h_locations, self.h_table = None, None, None
 
     def successor(self, A):
         """Return a list of (action, result) pairs."""
@@ -55,10 +95,15 @@ class GPSProblem(Problem):
         return cost_so_far + (self.graph.get(A, B) or infinity)
 
     def h(self, node):
-        """h function is straight-line distance from a node's state to goal."""
+        """h function is straight-line distance from a node's state to goal,
+        read from the heuristic_table of the graph for this goal. The table
+        is looked up again whenever the goal or graph.locations changes."""
         locs = getattr(self.graph, 'locations', None)
-        if locs:
-            return int(distance(locs[node.state], locs[self.goal]))
-        else:
+        if (self.h_goal != self.goal or self.h_locations is not locs
+                or len(self.h_table or ()) != len(locs or ())):
+            self.h_goal, self.h_locations = self.goal, locs
+            self.h_table = heuristic_table(self.graph, self.goal)
+        if self.h_table is None:
             return infinity
+        return self.h_table[node.state]
 
@@ -4,10 +4,12 @@ The way to use this code is to subclass Problem to create a class of problems,
 then create problem instances and solve them with calls to the various search
 functions."""
 import copy
+import heapq
+import itertools
+import time
 
-from core.node import Node
+from core.node import Node, NodeArena
 from core.utils import *
-from collections import deque
 from core.graph import Graph, UndirectedGraph, RandomGraph
 
 romania = UndirectedGraph(Dict(
@@ -40,25 +42,48 @@ australia.locations = Dict(WA=(120, 24), NT=(135, 20), SA=(135, 30),
                            Q=(145, 20), NSW=(145, 32), T=(145, 42), V=(145, 37))
 
 
-def graph_search(problem, fringe, sort_function=None):
-    """Search through the successors of a problem to find a goal."""
+def _priority_fringe(problem, fringe, sort_function):
+    """Turn a plain fringe plus a sort_function(node, problem) into a heap
+    backed PriorityQueue. Popping it gives the same order as re-sorting the
+    whole fringe with a stable sort before every pop, in O(log n)."""
+    if sort_function:
+        return PriorityQueue(lambda n: sort_function(n, problem), fringe)
+    return fringe
+
+
+def graph_search(problem, fringe, sort_function=None, prune=False, stats=None, monitor=None):
+    """Search through the successors of a problem to find a goal. The fringe
+    can be a Stack, a FIFOQueue or a PriorityQueue; passing sort_function
+    orders any other fringe by sort_function(node, problem).
+
+    With prune=True duplicates are dropped when they are generated instead
+    of when they are popped: see pruning_graph_search. stats, a dict or
+    Struct, receives its counters (only generated and visited without
+    pruning). Passing a core.monitor.SearchMonitor runs
+    monitored_graph_search instead; it keeps its own metrics."""
+    fringe = _priority_fringe(problem, fringe, sort_function)
+    if monitor is not None:
+        if prune:
+            raise ValueError("prune and monitor cannot be combined")
+        if stats is not None:
+            raise ValueError("stats and monitor cannot be combined")
+        return monitored_graph_search(problem, fringe, monitor)
+    if prune:
+        return pruning_graph_search(problem, fringe, stats)
     closed = set()
     fringe.append(Node(problem.initial))
     generated = 1  # Counter for generated nodes (starts in 1)
     visited = 0    # Counter for visited nodes
+    result = None
 
     while fringe:
-        # Sort the fringe on each iteration if a sorting function is provided
-        if sort_function:
-            fringe = deque(sorted(list(fringe), key=lambda n: sort_function(n, problem)))
-            node = fringe.popleft()
-        else:
-            node = fringe.pop()
+        node = fringe.pop()
 
         visited += 1
 
         if problem.goal_test(node.state):
-            return generated, visited, node.path_cost, node.path()
+            result = generated, visited, node.path_cost, node.path()
+            break
 
         if node.state not in closed:
             closed.add(node.state)
@@ -66,98 +91,866 @@ def graph_search(problem, fringe, sort_function=None):
             generated += len(successors)
             fringe.extend(successors)
 
-    return None
+    if stats is not None:
+        update(stats, generated=generated, visited=visited)
+    return result
+
+
+def pruning_graph_search(problem, fringe, stats=None):
+    """graph_search that keeps at most one live fringe entry per state.
+    Successors whose state is already closed are dropped, and so are those
+    no cheaper than the best node already pushed for their state; a cheaper
+    one makes the older entry stale, and stale entries are skipped when they
+    come out of the fringe (lazy invalidation). generated only counts the
+    nodes pushed and visited the live nodes popped. If stats (a dict or
+    Struct) is given it is updated with generated, visited, and the
+    suppressed_closed, suppressed_dominated and stale counters."""
+    closed = set()
+    root = Node(problem.initial)
+    best = {root.state: root.path_cost}  # Cheapest path_cost pushed per state
+    fringe.append(root)
+    generated = 1  # Counter for generated (pushed) nodes (starts in 1)
+    visited = 0    # Counter for visited nodes
+    suppressed_closed = suppressed_dominated = stale = 0
+    result = None
+
+    while fringe:
+        node = fringe.pop()
+
+        if node.path_cost > best[node.state] or node.state in closed:
+            stale += 1
+            continue
+
+        visited += 1
+
+        if problem.goal_test(node.state):
+            result = generated, visited, node.path_cost, node.path()
+            break
+
+        closed.add(node.state)
+        for successor in node.expand(problem):
+            if successor.state in closed:
+                suppressed_closed += 1
+            elif successor.path_cost >= best.get(successor.state, infinity):
+                suppressed_dominated += 1
+            else:
+                best[successor.state] = successor.path_cost
+                generated += 1
+                fringe.append(successor)
+
+    if stats is not None:
+        update(stats, generated=generated, visited=visited, suppressed_closed=suppressed_closed,
+               suppressed_dominated=suppressed_dominated, stale=stale)
+    return result
+
+
+def monitored_graph_search(problem, fringe, monitor):
+    """graph_search that reports to monitor, a core.monitor.SearchMonitor:
+    the time spent in each phase, the peak fringe and closed sizes, and the
+    on_pop, on_expand and on_goal hooks. It visits the same nodes and
+    returns the same result as graph_search."""
+    clock = time.perf_counter
+    monitor.start(problem)
+    timers = monitor.timers
+    closed = set()
+    started = clock()
+    fringe.append(Node(problem.initial))
+    monitor.peak_fringe = len(fringe)
+    generated = 1  # Counter for generated nodes (starts in 1)
+    visited = 0    # Counter for visited nodes
+    pop_time = goal_time = expand_time = push_time = 0.0
+    result = None
+
+    while fringe:
+        t0 = clock()
+        node = fringe.pop()
+        t1 = clock()
+        visited += 1
+        monitor.on_pop(node)
+        t2 = clock()
+        found = problem.goal_test(node.state)
+        t3 = clock()
+        pop_time += t1 - t0
+        goal_time += t3 - t2
+
+        if found:
+            monitor.on_goal(node)
+            result = generated, visited, node.path_cost, node.path()
+            break
+
+        if node.state not in closed:
+            closed.add(node.state)
+            t0 = clock()
+            successors = node.expand(problem)
+            t1 = clock()
+            generated += len(successors)
+            fringe.extend(successors)
+            t2 = clock()
+            expand_time += t1 - t0
+            push_time += t2 - t1
+            monitor.expansions += 1
+            if len(fringe) > monitor.peak_fringe:
+                monitor.peak_fringe = len(fringe)
+            monitor.on_expand(node, successors)
+
+    monitor.peak_closed = len(closed)
+    timers.update(pop=pop_time, goal_test=goal_time, expand=expand_time, push=push_time)
+    monitor.finish(generated, visited, clock() - started, fringe, closed, result)
+    return result
 
 
 def graph_search_generator(problem, fringe, sort_function=None):
-    """Generator version of the graph_search function for the UI"""
+    """Generator version of the graph_search function for the UI. Yields
+    (generated, visited, path_cost, path, closed, fringe, successors) after
+    every expansion, where successors are the nodes it added to the fringe;
+    closed and fringe are the live structures of the search."""
     closed = set()
+    fringe = _priority_fringe(problem, fringe, sort_function)
     fringe.append(Node(problem.initial))
     generated = 1  # Counter for generated nodes (starts in 1)
     visited = 0    # Counter for visited nodes
 
     while fringe:
-        if sort_function:
-            fringe = deque(sorted(list(fringe), key=lambda n: sort_function(n, problem)))
-            node = fringe.popleft()
-        else:
-            node = fringe.pop()
+        node = fringe.pop()
 
         visited += 1
         if problem.goal_test(node.state):
-            yield generated, visited, node.path_cost, node.path(), closed, fringe
+            yield generated, visited, node.path_cost, node.path(), closed, fringe, []
             return
         if node.state not in closed:
             closed.add(node.state)
             successors = node.expand(problem)
             generated += len(successors)
             fringe.extend(successors)
-            yield generated, visited, node.path_cost, node.path(), closed, fringe
+            yield generated, visited, node.path_cost, node.path(), closed, fringe, successors
+
+    yield generated, visited, node.path_cost, node.path(), closed, fringe, []
+
+
+def arena_graph_search(problem, fringe, sort_function=None, arena=None):
+    """graph_search with the search tree kept in a NodeArena: the fringe holds
+    arena rows instead of Nodes, and only the Nodes of the returned path are
+    ever built. sort_function(node, problem) is given a NodeArena.view of the
+    row. Returns the same (generated, visited, path_cost, path) tuple."""
+    if arena is None:
+        arena = NodeArena()
+    if sort_function:
+        fringe = PriorityQueue(lambda i: sort_function(arena.view(i), problem), fringe)
+    closed = set()
+    fringe.append(arena.add(problem.initial))
+    generated = 1  # Counter for generated nodes (starts in 1)
+    visited = 0    # Counter for visited nodes
 
-    yield generated, visited, node.path_cost, node.path(), closed, fringe
+    while fringe:
+        i = fringe.pop()
+
+        visited += 1
+        state = arena.state_of(i)
+
+        if problem.goal_test(state):
+            return generated, visited, arena.path_cost[i], arena.path(i)
+
+        if state not in closed:
+            closed.add(state)
+            successors = arena.expand(i, problem)
+            generated += len(successors)
+            fringe.extend(successors)
+
+    return None
 
 # ________________________SEARCH ALGORITHMS_________________________________
 
 
-def breadth_first_graph_search(problem) -> Node:
-    """Search the shallowest nodes in the search tree first. [p 74]"""
-    return graph_search(problem, FIFOQueue())  # FIFOQueue -> fringe
+def breadth_first_graph_search(problem, **options) -> Node:
+    """Search the shallowest nodes in the search tree first. [p 74]
+    Keyword options (prune, stats, monitor) are passed on to graph_search;
+    search=f runs f(problem, fringe, **options) instead, for instance
+    search=graph_search_generator to step through the same search."""
+    search = options.pop('search', graph_search)
+    return search(problem, FIFOQueue(), **options)  # FIFOQueue -> fringe
 
 
-def depth_first_graph_search(problem) -> Node:
+def depth_first_graph_search(problem, **options) -> Node:
     """Search the deepest nodes in the search tree first. [p 74]"""
-    return graph_search(problem, Stack())
+    search = options.pop('search', graph_search)
+    return search(problem, Stack(), **options)
 
 
-def branch_and_bound(problem) -> Node:
+def branch_and_bound(problem, **options) -> Node:
     """Branch and Bound search algorithm using graph_search."""
-    def sort_by_path_cost(node, problem):
+    def sort_by_path_cost(node):
         return node.path_cost
 
-    return graph_search(problem, deque(), sort_by_path_cost)
+    search = options.pop('search', graph_search)
+    return search(problem, PriorityQueue(sort_by_path_cost), **options)
+
+
+def branch_and_bound_to_many(problem, goals):
+    """Branch and Bound from problem.initial to every state in goals, growing
+    a single search tree. Each goal is settled the first time it is popped,
+    and the search stops as soon as all of them are. Returns (generated,
+    visited, results) where results maps each reachable goal to its
+    (path_cost, path); goals that cannot be reached are left out."""
+    def sort_by_path_cost(node):
+        return node.path_cost
+
+    pending = set(goals)
+    results = {}
+    closed = set()
+    fringe = PriorityQueue(sort_by_path_cost)
+    fringe.append(Node(problem.initial))
+    generated = 1  # Counter for generated nodes (starts in 1)
+    visited = 0    # Counter for visited nodes
+
+    while fringe and pending:
+        node = fringe.pop()
+
+        visited += 1
+
+        if node.state in pending:
+            pending.discard(node.state)
+            results[node.state] = node.path_cost, node.path()
+
+        if pending and node.state not in closed:
+            closed.add(node.state)
+            successors = node.expand(problem)
+            generated += len(successors)
+            fringe.extend(successors)
+
+    return generated, visited, results
 
 
-def branch_and_bound_underestimation(problem) -> Node:
+def sort_by_underestimation(node, problem):
+    """sort_function of Branch and Bound with underestimation: f = g + h."""
+    return node.path_cost + problem.h(node)
+
+
+def branch_and_bound_underestimation(problem, **options) -> Node:
     """Branch and Bound search algorithm with underestimation using graph_search."""
-    def underestimation(node, problem):
-        return node.path_cost + problem.h(node)
+    search = options.pop('search', graph_search)
+    return search(problem, PriorityQueue(lambda node: sort_by_underestimation(node, problem)), **options)
+
+
+# The algorithms that take search= options, by the names used in batch jobs
+ALGORITHMS = {
+    'bfs': breadth_first_graph_search,
+    'dfs': depth_first_graph_search,
+    'bab': branch_and_bound,
+    'bab_u': branch_and_bound_underestimation,
+}
+
+
+def bidirectional_branch_and_bound(problem) -> Node:
+    """Branch and Bound grown from both ends of the route at once."""
+    return bidirectional_graph_search(problem)
+
+
+def bidirectional_branch_and_bound_underestimation(problem) -> Node:
+    """Branch and Bound with underestimation grown from both ends of the route at once."""
+    return bidirectional_graph_search(problem, underestimation=True)
+
+
+def _on_path(node):
+    """Is the state of node already on the path from the root to its parent?"""
+    x = node.parent
+    while x:
+        if x.state == node.state:
+            return True
+        x = x.parent
+    return False
+
+
+def _goal_reachable(problem):
+    """Can some goal state be reached from problem.initial at all? One sweep
+    over the reachable states; IDA* and RBFS never remember states, so on
+    their own they only rule a goal out after trying every path."""
+    seen, stack = {problem.initial}, [problem.initial]
+    while stack:
+        state = stack.pop()
+        if problem.goal_test(state):
+            return True
+        for (_, next) in problem.successor(state):
+            if next not in seen:
+                seen.add(next)
+                stack.append(next)
+    return False
+
+
+def iterative_deepening_a_star(problem):
+    """Iterative deepening A* (IDA*): depth-first searches bounded by
+    f = path_cost + h, each one raising the bound to the smallest f that
+    went over it in the last. Nothing is kept between iterations and states
+    already on the current path are not revisited, so memory stays linear in
+    the depth of the solution. Returns (generated, visited, path_cost, path)
+    like graph_search, counting the work of every iteration, or None if the
+    goal is unreachable.
+
+    On graphs with cycles the number of paths, and so the work, can grow
+    exponentially with the size of the graph. Unreachable goals are ruled
+    out up front by a sweep over the reachable states, which takes memory
+    linear in their number. A problem.h that is infinite at the start (no
+    heuristic) is replaced by 0."""
+    root = Node(problem.initial)
+    h = problem.h if problem.h(root) < infinity else (lambda node: 0)
+
+    def f(node):
+        return node.path_cost + h(node)
+
+    if not _goal_reachable(problem):
+        return None
+    generated = 1  # Counter for generated nodes (starts in 1)
+    visited = 0    # Counter for visited nodes
+    bound = f(root)
+
+    while True:
+        next_bound = infinity
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            cost = f(node)
+            if cost > bound:
+                next_bound = min(next_bound, cost)
+                continue
+
+            visited += 1
+
+            if problem.goal_test(node.state):
+                return generated, visited, node.path_cost, node.path()
 
-    # return bab_underestimation(problem, deque())
-    return graph_search(problem, deque(), underestimation)
+            successors = [s for s in node.expand(problem) if not _on_path(s)]
+            generated += len(successors)
+            stack.extend(reversed(successors))
+
+        if next_bound == infinity:
+            return None
+        bound = next_bound
+
+
+def recursive_best_first_search(problem):
+    """Recursive best-first search (RBFS) [Fig. 4.5]: best-first search that
+    only keeps the current path and the siblings of its nodes. When the best
+    child gets worse than the best alternative elsewhere, its subtree is
+    forgotten and its f is backed up to the parent so it can be regrown
+    later. Memory is linear in the depth of the solution. Returns
+    (generated, visited, path_cost, path) like graph_search, or None if the
+    goal is unreachable.
+
+    The recursion of the book is kept on an explicit stack, so deep
+    solutions are not limited by Python's recursion limit. As with IDA*,
+    the work can grow exponentially on graphs with cycles, unreachable
+    goals are ruled out up front by a sweep over the reachable states, and
+    a problem.h that is infinite at the start is replaced by 0."""
+    root = Node(problem.initial)
+    h = problem.h if problem.h(root) < infinity else (lambda node: 0)
+
+    def f(node):
+        return node.path_cost + h(node)
+
+    if not _goal_reachable(problem):
+        return None
+    generated = 1  # Counter for generated nodes (starts in 1)
+    visited = 0    # Counter for visited nodes
+    # (f_limit, entries) for every node on the current path; entries are
+    # [backed up f, position, node] and position keeps ties in expansion order
+    frames = []
+    node, f_node, f_limit = root, f(root), infinity
+
+    while True:
+        visited += 1
+        if problem.goal_test(node.state):
+            return generated, visited, node.path_cost, node.path()
+        successors = [s for s in node.expand(problem) if not _on_path(s)]
+        generated += len(successors)
+        if successors:
+            frames.append((f_limit, [[max(f(s), f_node), i, s]
+                                     for (i, s) in enumerate(successors)]))
+            backed_up = None
+        else:
+            backed_up = infinity
+
+        # Return to the parents while their best child is over their limit
+        while True:
+            if not frames:
+                return None
+            f_limit, entries = frames[-1]
+            if backed_up is not None:
+                entries[0][0] = backed_up  # The child just left
+            entries.sort(key=lambda e: (e[0], e[1]))
+            best = entries[0]
+            if best[0] > f_limit or best[0] == infinity:
+                frames.pop()
+                backed_up = best[0]
+                continue
+            break
+
+        alternative = entries[1][0] if len(entries) > 1 else infinity
+        node, f_node, f_limit = best[2], best[0], min(f_limit, alternative)
+
+
+def anytime_weighted_a_star(problem, weight=2.5, decrement=0.5, timeout=None, node_budget=None):
+    """Anytime Repairing A* (ARA*): a run of weighted A* searches ordered by
+    path_cost + w * problem.h, starting at w = weight and lowering w by
+    decrement down to 1. The first, greedier search finds a route fast and
+    every later one improves it, reusing the costs found so far: only the
+    states whose cost dropped after they were expanded (kept aside as
+    inconsistent) are put back in the fringe.
+
+    The searches stop when the route is proven optimal, after timeout
+    seconds, or after node_budget expansions. Returns (generated, visited,
+    path_cost, path, bound) for the best route found, or None if none was
+    found in time. bound is the suboptimality proven for it: path_cost is at
+    most bound times the optimal cost (infinity before the first search
+    completes, 1 once optimal). problem.h must be consistent."""
+    clock = time.perf_counter
+    deadline = None if timeout is None else clock() + timeout
+    root = Node(problem.initial)
+    h0 = problem.h(root)
+    h = problem.h if h0 < infinity else (lambda node: 0)
+    best = {root.state: root}  # Cheapest node found for each state
+    hs = {root.state: h(root)}
+    fringe, inconsistent = [], {}
+    counter = itertools.count()
+    generated = 1  # Counter for generated nodes (starts in 1)
+    visited = 0    # Counter for visited nodes
+    incumbent = root if problem.goal_test(root.state) else None
+    w, bound = weight, infinity
+    fringe_nodes = [root]
+
+    while True:
+        # Order what is left by the keys of the new weight
+        fringe = [(n.path_cost + w * hs[n.state], next(counter), n) for n in fringe_nodes]
+        heapq.heapify(fringe)
+        closed = set()
+        finished = True
+        while fringe and (incumbent is None or fringe[0][0] < incumbent.path_cost):
+            if (node_budget is not None and visited >= node_budget) or \
+                    (deadline is not None and clock() > deadline):
+                finished = False
+                break
+            _, _, node = heapq.heappop(fringe)
+            if best[node.state] is not node or node.state in closed:
+                continue  # A cheaper node for this state was found since
+            visited += 1
+            closed.add(node.state)
+            successors = node.expand(problem)
+            generated += len(successors)
+            for successor in successors:
+                state = successor.state
+                seen = best.get(state)
+                if seen is not None and successor.path_cost >= seen.path_cost:
+                    continue
+                best[state] = successor
+                if state not in hs:
+                    hs[state] = h(successor)
+                if problem.goal_test(state) and (incumbent is None or
+                                                 successor.path_cost < incumbent.path_cost):
+                    incumbent = successor
+                if state in closed:
+                    inconsistent[state] = successor
+                else:
+                    heapq.heappush(fringe, (successor.path_cost + w * hs[state], next(counter), successor))
+        if not finished:
+            break
+        fringe_nodes = [n for (_, _, n) in fringe if best[n.state] is n and n.state not in closed]
+        fringe_nodes += [n for n in inconsistent.values() if best[n.state] is n]
+        inconsistent = {}
+        if incumbent is not None:
+            lowest = min((n.path_cost + hs[n.state] for n in fringe_nodes), default=infinity)
+            if incumbent.path_cost <= lowest:
+                bound = 1.0
+            else:
+                bound = max(1.0, min(w, incumbent.path_cost / lowest if lowest else infinity))
+        if incumbent is None and not fringe_nodes:
+            break  # The goal cannot be reached
+        if bound <= 1 or w <= 1:
+            bound = 1.0 if incumbent is not None else bound
+            break
+        w = max(1.0, w - decrement)
+
+    if incumbent is None:
+        return None
+    return generated, visited, incumbent.path_cost, incumbent.path(), bound
+
+
+def beam_search(problem, sort_function=sort_by_underestimation, width=100):
+    """Breadth-first search that only keeps the width best nodes of each
+    level, as scored by sort_function(node, problem) like in graph_search.
+    Each state is kept at most once per level, and paths that come back to
+    one of their own states are dropped, so no closed set is needed and
+    memory stays within width nodes per level. Returns (generated, visited,
+    path_cost, path) for the cheapest goal in the first level that has one,
+    which need not be the cheapest route, or None if the beam dies out."""
+    beam = [Node(problem.initial)]
+    generated = 1  # Counter for generated nodes (starts in 1)
+    visited = 0    # Counter for visited nodes
+
+    while beam:
+        visited += len(beam)
+        goals = [node for node in beam if problem.goal_test(node.state)]
+        if goals:
+            node = min(goals, key=lambda n: n.path_cost)
+            return generated, visited, node.path_cost, node.path()
+        level = {}  # Best scored successor for each state
+        for node in beam:
+            successors = node.expand(problem)
+            generated += len(successors)
+            for successor in successors:
+                if _on_path(successor):
+                    continue
+                score = sort_function(successor, problem)
+                if successor.state not in level or score < level[successor.state][0]:
+                    level[successor.state] = (score, successor)
+        beam = [node for (score, node) in heapq.nsmallest(width, level.values(), key=lambda e: e[0])]
+
+    return None
+
+
+class _Entry:
+    """A node held in memory by bounded_best_first_search: its f, the states
+    of its children in memory, the backed up f of each successor it does
+    not hold (infinity for those that cannot lead to a better route), and
+    its current records in the open and leaf heaps (None when it is in
+    neither)."""
+
+    __slots__ = ('node', 'parent', 'f', 'expanded', 'children', 'forgotten', 'open', 'leaf')
+
+    def __init__(self, node, parent, f):
+        self.node, self.parent, self.f = node, parent, f
+        self.expanded = False
+        self.children = set()
+        self.forgotten = {}
+        self.open = self.leaf = None
+
+    def release(self):
+        """Let go of everything once out of memory; stale heap records may
+        still point at the entry until they are popped."""
+        self.node = self.parent = self.children = self.forgotten = None
+        self.open = self.leaf = None
+
+    def key(self):
+        """The f it goes back in the fringe with: its own f until it is
+        expanded, then the lowest f among the successors it does not hold."""
+        if not self.expanded:
+            return self.f
+        return min(self.forgotten.values(), default=infinity)
+
+
+def bounded_best_first_search(problem, sort_function=sort_by_underestimation, max_nodes=1000):
+    """Best-first search that holds at most max_nodes nodes in memory, in the
+    manner of SMA*. Nodes are ordered by sort_function(node, problem), never
+    lower than their parent's (pathmax), deepest first among equals. Memory
+    holds each state at most once, as the best-g table of the search: a
+    successor no cheaper than the node held for its state is dominated and
+    pruned, like in pruning_graph_search, and a cheaper one replaces it
+    together with everything grown below it. When memory is full the worst
+    leaf (highest f, shallowest) is forgotten and its f backed up to its
+    parent, which grows it again once that is the best f left. Besides the
+    nodes, each held node keeps the backed up f of the successors it forgot,
+    so memory grows with max_nodes and the branching factor, never with the
+    size of the graph. Routes longer than max_nodes nodes cannot be held and
+    are given up. With an admissible sort_function the route found is
+    optimal whenever max_nodes leaves room for it. Like SMA*, it thrashes
+    when max_nodes barely holds the route: the same nodes are forgotten and
+    grown again many times, and proving that no route fits can take
+    exponential time. Returns (generated, visited, path_cost, path) like
+    graph_search, or None."""
+    counter = itertools.count()
+    memory = {}     # {state: _Entry}, the nodes held
+    open_heap = []  # (key, -depth, count, entry), best first
+    leaf_heap = []  # (-key, depth, count, entry), worst leaf first
+    current = None  # The entry being expanded, which must not be forgotten
+
+    def refresh(entry):
+        """Push new heap records for entry if its key or shape changed."""
+        key = entry.key()
+        if key == infinity:
+            entry.open = None
+        elif entry.open is None or entry.open[0] != key:
+            entry.open = (key, -entry.node.depth, next(counter), entry)
+            heapq.heappush(open_heap, entry.open)
+        if entry.children or entry.parent is None or entry is current:
+            entry.leaf = None
+        elif entry.leaf is None or -entry.leaf[0] != key:
+            entry.leaf = (-key, entry.node.depth, next(counter), entry)
+            heapq.heappush(leaf_heap, entry.leaf)
+
+    def dead(entry):
+        """Can nothing held or forgotten below entry lead to a goal?"""
+        return (entry is not current and entry.parent is not None and entry.expanded
+                and not entry.children and entry.key() == infinity)
+
+    def forget(entry, f):
+        """Take the leaf entry out of memory, backing f up to its parent; a
+        parent left with nothing that can lead to a goal goes too."""
+        while True:
+            state, parent = entry.node.state, entry.parent
+            del memory[state]
+            entry.release()
+            parent.children.discard(state)
+            parent.forgotten[state] = f
+            if not dead(parent):
+                refresh(parent)
+                return
+            entry, f = parent, infinity
+
+    def discard(entry):
+        """Drop entry and the subtree below it: a cheaper path to its state
+        has been found, so nothing below it needs to be backed up."""
+        state, parent = entry.node.state, entry.parent
+        stack = [entry]
+        while stack:
+            x = stack.pop()
+            stack.extend(memory[s] for s in x.children)
+            del memory[x.node.state]
+            x.release()
+        parent.children.discard(state)
+        parent.forgotten[state] = infinity
+        if dead(parent):
+            forget(parent, infinity)
+        else:
+            refresh(parent)
+
+    def worst_leaf(keep):
+        """Pop and return the worst leaf in memory other than keep, or None."""
+        kept = None
+        while leaf_heap:
+            record = heapq.heappop(leaf_heap)
+            entry = record[3]
+            if entry.leaf is not record:
+                continue
+            if entry is keep:
+                kept = record
+                continue
+            if kept is not None:
+                heapq.heappush(leaf_heap, kept)
+            entry.leaf = None
+            return entry
+        if kept is not None:
+            heapq.heappush(leaf_heap, kept)
+        return None
+
+    root = Node(problem.initial)
+    root_entry = _Entry(root, None, sort_function(root, problem))
+    memory[root.state] = root_entry
+    refresh(root_entry)
+    generated = 1  # Counter for generated nodes (starts in 1)
+    visited = 0    # Counter for visited nodes
+
+    while open_heap:
+        record = heapq.heappop(open_heap)
+        (f, _, _, entry) = record
+        if entry.open is not record:
+            continue
+        entry.open = None
+        node = entry.node
+        visited += 1
+        if problem.goal_test(node.state):
+            return generated, visited, node.path_cost, node.path()
+
+        # Grow the successors never seen before, and the forgotten ones at f
+        current = entry
+        entry.leaf = None
+        forgotten = entry.forgotten
+        successors = [s for s in node.expand(problem)
+                      if s.state not in entry.children and forgotten.get(s.state, f) <= f]
+        generated += len(successors)
+        entry.expanded = True
+        children = []
+        for successor in successors:
+            backed_up = forgotten.pop(successor.state, entry.f)
+            held = memory.get(successor.state)
+            if held is not None:
+                if held.node.path_cost <= successor.path_cost:
+                    forgotten[successor.state] = infinity  # Dominated
+                    continue
+                discard(held)
+            children.append((max(sort_function(successor, problem), entry.f, backed_up), successor))
+        # Best child last, so that the one just stored is never the one dropped
+        children.sort(key=lambda c: c[0], reverse=True)
+        for (child_f, successor) in children:
+            child = memory[successor.state] = _Entry(successor, entry, child_f)
+            entry.children.add(successor.state)
+            refresh(child)
+            while len(memory) > max_nodes:
+                leaf = worst_leaf(child)
+                if leaf is None:
+                    # Memory holds only the path down to child: no room to go deeper
+                    child.leaf = None
+                    forget(child, infinity)
+                    break
+                forget(leaf, leaf.key())
+        current = None
+        if dead(entry):
+            forget(entry, infinity)
+        else:
+            refresh(entry)
+        # Stale records are skipped when popped; drop them before they outgrow memory
+        for (heap, field) in ((open_heap, 'open'), (leaf_heap, 'leaf')):
+            if len(heap) > 2 * len(memory) + 16:
+                heap[:] = [r for r in heap if getattr(r[3], field) is r]
+                heapq.heapify(heap)
+
+    return None
+
+
+def bidirectional_graph_search(problem, underestimation=False):
+    """Uniform-cost search grown from problem.initial and problem.goal at the
+    same time, for graphs whose links go both ways. Each side expands the
+    node with the lowest key from whichever fringe has the lowest top, and
+    every link reaching a state the other side has seen proposes a route.
+    The search stops once the two tops together reach the best route found,
+    since no later meeting could be shorter.
+
+    With underestimation, the keys add the average potential
+    (h_goal(n) - h_initial(n)) / 2 (negated on the backward side), which is
+    consistent in both directions whenever problem.h is, so the result is
+    still optimal. Returns (generated, visited, path_cost, path) like
+    graph_search, counting the nodes of both trees."""
+    if getattr(getattr(problem, 'graph', None), 'directed', False):
+        raise ValueError("bidirectional search needs an undirected graph")
+    backward = copy.copy(problem)
+    backward.initial, backward.goal = problem.goal, problem.initial
+    problems = (problem, backward)
+
+    root = Node(problem.initial)
+    if problem.goal_test(root.state):
+        return 1, 1, root.path_cost, root.path()
+
+    use_potential = underestimation and problem.h(root) < infinity
+
+    def potential(node, side):
+        p = (problem.h(node) - backward.h(node)) / 2
+        return p if side == 0 else -p
+
+    def key(side):
+        if not use_potential:
+            return lambda node: node.path_cost
+        return lambda node: node.path_cost + potential(node, side)
+
+    fringes = (PriorityQueue(key(0)), PriorityQueue(key(1)))
+    closed = (set(), set())
+    best = ({}, {})  # Cheapest node seen for each state, on each side
+    for (side, node) in enumerate((root, Node(backward.initial))):
+        fringes[side].append(node)
+        best[side][node.state] = node
+    generated = 2  # Counter for generated nodes (both roots)
+    visited = 0    # Counter for visited nodes
+    best_cost, meeting = infinity, None
+
+    while fringes[0] and fringes[1]:
+        tops = [fringe.top_key() for fringe in fringes]
+        if tops[0] + tops[1] >= best_cost:
+            break
+        side = 0 if tops[0] <= tops[1] else 1
+        node = fringes[side].pop()
+        visited += 1
+        if node.state in closed[side]:
+            continue
+        closed[side].add(node.state)
+        successors = node.expand(problems[side])
+        generated += len(successors)
+        for successor in successors:
+            seen = best[side].get(successor.state)
+            if seen is None or successor.path_cost < seen.path_cost:
+                best[side][successor.state] = successor
+            other = best[1 - side].get(successor.state)
+            if other is not None and successor.path_cost + other.path_cost < best_cost:
+                best_cost = successor.path_cost + other.path_cost
+                meeting = (successor, other) if side == 0 else (other, successor)
+        fringes[side].extend(successors)
+
+    if meeting is None:
+        return None
+    # Continue the forward path along the backward tree, back to the goal
+    node, other = meeting
+    while other.parent:
+        other = other.parent
+        action = next(act for (act, state) in problem.successor(node.state) if state == other.state)
+        node = Node(other.state, node, action,
+                    problem.path_cost(node.path_cost, node.state, action, other.state))
+    return generated, visited, node.path_cost, node.path()
 
 
 class BidirectionalIterator:
-    """ Bidirectional Iterator that allows the UI to go forward and backwards in search process """
-    def __init__(self, generator):
+    """ Bidirectional Iterator that allows the UI to go forward and backwards in search process.
+
+    It wraps a graph_search_generator and returns the same items without
+    the successors: (generated, visited, path_cost, path, closed, fringe).
+    Instead of copying closed and fringe at every step, it records for each
+    step only the expanded node and the successors pushed, plus a copy of
+    closed and fringe every checkpoint_interval steps. Any step is rebuilt by
+    replaying the pops and pushes from the nearest checkpoint before it, so
+    history grows with the number of generated nodes, not with steps times
+    fringe size. The returned closed and fringe are reused between calls. """
+    def __init__(self, generator, checkpoint_interval=100):
         self.generator = generator
-        self.history = []
+        self.checkpoint_interval = checkpoint_interval
+        self.steps = []         # (generated, visited, path_cost, node, successors, expanded)
+        self.checkpoints = {}   # step -> (closed, fringe) right after that step
         self.index = -1
+        self.closed = None      # closed and fringe as they are after step self.index
+        self.fringe = None
+        self.closed_size = 0    # Size of the generator's closed after the last pull
 
     def next(self):
-        if self.index < len(self.history) - 1:
-            self.index += 1
-            return self.history[self.index]
-        else:
-            try:
-                next_item = next(self.generator)
-                # Makes deepcopy from the mutable elements
-                next_item_copy = self._deep_copy_item(next_item)
-                self.history.append(next_item_copy)
-                self.index += 1
-                return next_item_copy
-            except StopIteration:
-                raise StopIteration("No more items in generator")
+        if self.index == len(self.steps) - 1 and not self._pull():
+            raise StopIteration("No more items in generator")
+        return self.seek(self.index + 1)
 
     def prev(self):
         if self.index > 0:
-            self.index -= 1
-            return self.history[self.index]
+            return self.seek(self.index - 1)
         else:
             raise IndexError("Already at the first item")
 
-    @staticmethod
-    def _deep_copy_item(item):
-        generated, visited, path_cost, path, closed, fringe = item
-        closed_copy = copy.deepcopy(closed)
-        fringe_copy = copy.deepcopy(fringe)
-        return generated, visited, path_cost, path, closed_copy, fringe_copy
+    def seek(self, step):
+        """Move to the given step (pulling from the generator as needed) and
+        return its item."""
+        while step >= len(self.steps) and self._pull():
+            pass
+        if not 0 <= step < len(self.steps):
+            raise IndexError("No step %d in search" % step)
+        start = max(c for c in self.checkpoints if c <= step)
+        if step < self.index or start > self.index or self.closed is None:
+            closed, fringe = self.checkpoints[start]
+            self.closed, self.fringe = set(closed), copy.copy(fringe)
+            self.index = start
+        while self.index < step:
+            self.index += 1
+            self._replay(self.steps[self.index])
+        generated, visited, path_cost, node, _, _ = self.steps[step]
+        return generated, visited, path_cost, node.path(), self.closed, self.fringe
+
+    def _replay(self, item):
+        """Apply one step's pops and pushes to self.closed and self.fringe."""
+        generated, visited, path_cost, node, successors, expanded = item
+        pops = visited - self._visited_before(self.index)
+        for _ in range(pops):
+            popped = self.fringe.pop()
+        if expanded:
+            self.closed.add(popped.state)
+            self.fringe.extend(successors)
+
+    def _visited_before(self, step):
+        return self.steps[step - 1][1] if step > 0 else 0
+
+    def _pull(self):
+        """Record the next step of the generator; False when it is exhausted."""
+        try:
+            generated, visited, path_cost, path, closed, fringe, successors = next(self.generator)
+        except StopIteration:
+            return False
+        if not self.steps:
+            # Before the first step the fringe only held the root
+            initial = copy.copy(fringe)
+            while initial:
+                initial.pop()
+            initial.append(path[-1])
+            self.checkpoints[-1] = (set(), initial)
+        expanded = len(closed) > self.closed_size
+        self.closed_size = len(closed)
+        self.steps.append((generated, visited, path_cost, path[0], list(successors), expanded))
+        step = len(self.steps) - 1
+        if (step + 1) % self.checkpoint_interval == 0:
+            self.checkpoints[step] = (set(closed), copy.copy(fringe))
+        return True
@@ -0,0 +1,121 @@
+"""Spatial indexing of 2D points.
+
+A GridIndex buckets points into square cells of a uniform grid. A nearest
+neighbour query looks at the query's own cell and then at rings of cells
+around it, and stops as soon as the next ring is farther away than the best
+point found, so it only looks at a handful of points instead of all of them.
+
+LocationIndex puts a GridIndex over Graph.locations, to snap raw coordinates
+to the closest graph nodes before building a GPSProblem."""
+import heapq
+import math
+
+
+class GridIndex:
+    """Uniform grid over a list of (x, y) points. Queries answer with
+    positions in that list; ties in distance go to the lowest position, the
+    same choice argmin makes over the list. cell_size defaults to a size
+    that puts about two points in each cell."""
+
+    def __init__(self, points, cell_size=None):
+        self.points = points = list(points)
+        if points:
+            xs, ys = [p[0] for p in points], [p[1] for p in points]
+            self.x0, self.y0 = min(xs), min(ys)
+            width, height = max(xs) - self.x0, max(ys) - self.y0
+        else:
+            self.x0 = self.y0 = width = height = 0
+        if cell_size is None:
+            cell_size = math.sqrt(2 * max(width * height, 1) / max(len(points), 1))
+        self.cell_size = max(cell_size, 1e-9)
+        self.columns = int(width / self.cell_size) + 1
+        self.rows = int(height / self.cell_size) + 1
+        self.cells = {}
+        for (i, (x, y)) in enumerate(points):
+            self.cells.setdefault(self.cell(x, y), []).append(i)
+
+    def cell(self, x, y):
+        """Return the (column, row) of the cell holding point (x, y)."""
+        return int((x - self.x0) // self.cell_size), int((y - self.y0) // self.cell_size)
+
+    def ring(self, cx, cy, r):
+        """Return the (column, row) of the cells exactly r cells away (in
+        rows or columns) from cell (cx, cy)."""
+        if r == 0:
+            return [(cx, cy)]
+        cells = [(x, y) for x in range(cx - r, cx + r + 1) for y in (cy - r, cy + r)]
+        cells += [(x, y) for y in range(cy - r + 1, cy + r) for x in (cx - r, cx + r)]
+        return cells
+
+    def nearest(self, x, y, exclude=None):
+        """Return the position of the point closest to (x, y), skipping the
+        positions for which exclude(position) is true, or None if every point
+        is excluded."""
+        cx, cy = self.cell(x, y)
+        # Farthest ring that can still hold points, seen from this cell
+        last = max(cx, self.columns - 1 - cx, cy, self.rows - 1 - cy)
+        points, cells, hypot = self.points, self.cells, math.hypot
+        best, best_d = None, math.inf
+        r = 0
+        while r <= last and (r - 1) * self.cell_size <= best_d:
+            for cell in self.ring(cx, cy, r):
+                for i in cells.get(cell, ()):
+                    px, py = points[i]
+                    d = hypot(px - x, py - y)
+                    if (d < best_d or (d == best_d and i < best)) and not (exclude and exclude(i)):
+                        best, best_d = i, d
+            r += 1
+        return best
+
+    def k_nearest(self, x, y, k, exclude=None):
+        """Return the positions of the k points closest to (x, y), closest
+        first, skipping the positions for which exclude(position) is true.
+        Fewer than k are returned when there are not enough points."""
+        if k <= 0:
+            return []
+        cx, cy = self.cell(x, y)
+        last = max(cx, self.columns - 1 - cx, cy, self.rows - 1 - cy)
+        points, cells, hypot = self.points, self.cells, math.hypot
+        # Max-heap of the best k found so far, as (-distance, -position)
+        best = []
+        r = 0
+        while r <= last and (len(best) < k or (r - 1) * self.cell_size <= -best[0][0]):
+            for cell in self.ring(cx, cy, r):
+                for i in cells.get(cell, ()):
+                    px, py = points[i]
+                    entry = (-hypot(px - x, py - y), -i)
+                    if (len(best) < k or entry > best[0]) and not (exclude and exclude(i)):
+                        if len(best) < k:
+                            heapq.heappush(best, entry)
+                        else:
+                            heapq.heapreplace(best, entry)
+            r += 1
+        return [-i for (d, i) in sorted(best, reverse=True)]
+
+    def nearest_many(self, points):
+        """Return the nearest position for each (x, y) in points, which may be
+        any iterable of pairs, such as a list of tuples or an n x 2 array."""
+        return [self.nearest(p[0], p[1]) for p in points]
+
+
+class LocationIndex:
+    """A GridIndex over graph.locations that answers with node names. The
+    index is a snapshot: build a new one after adding or moving locations."""
+
+    def __init__(self, graph, cell_size=None):
+        self.nodes = list(graph.locations)
+        self.grid = GridIndex([graph.locations[node] for node in self.nodes], cell_size)
+
+    def nearest(self, x, y):
+        """Return the node closest to (x, y), or None for an empty graph."""
+        position = self.grid.nearest(x, y)
+        return None if position is None else self.nodes[position]
+
+    def k_nearest(self, x, y, k):
+        """Return the k nodes closest to (x, y), closest first."""
+        return [self.nodes[i] for i in self.grid.k_nearest(x, y, k)]
+
+    def nearest_many(self, points):
+        """Return the closest node for each (x, y) in points."""
+        nodes = self.nodes
+        return [None if i is None else nodes[i] for i in self.grid.nearest_many(points)]
@@ -4,6 +4,7 @@
 
 infinity = 1.0e400
 import math
+import heapq
 
 def Dict(**entries):
     """Create a dict out of the argument=value arguments.
@@ -543,6 +544,11 @@ class FIFOQueue(Queue):
     def extend(self, items):
         self.A.extend(items)
 
+    def __copy__(self):
+        other = FIFOQueue()
+        other.A = self.A[self.start:]
+        return other
+
     def pop(self):
         e = self.A[self.start]
         self.start += 1
@@ -552,6 +558,49 @@ class FIFOQueue(Queue):
         return e
 
 
+class PriorityQueue(Queue):
+    """A Queue in which the item with the lowest f(item) is always popped
+    first, kept as a binary heap. Ties are broken by insertion order, so the
+    items come out exactly as a stable sort by f of everything appended so
+    far would return them."""
+
+    def __init__(self, f=lambda x: x, items=()):
+        self.f = f
+        self.A = []
+        self.count = 0
+        self.extend(items)
+
+    def append(self, item):
+        heapq.heappush(self.A, (self.f(item), self.count, item))
+        self.count += 1
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def pop(self):
+        return heapq.heappop(self.A)[2]
+
+    def top_key(self):
+        """Return f of the item pop() would return, without removing it."""
+        return self.A[0][0]
+
+    def __len__(self):
+        return len(self.A)
+
+    def __iter__(self):
+        """Iterate over the items in the order they would be popped."""
+        return (item for (_, _, item) in sorted(self.A))
+
+    def __str__(self):
+        return str(list(self))
+
+    def __copy__(self):
+        other = PriorityQueue(self.f)
+        other.A = list(self.A)
+        other.count = self.count
+        return other
+
 
 ## Fig: The idea is we can define things like Fig[3,10] later.
 ## Alas, it is Fig[3,10] not Fig[3.10], because that would be the same as Fig[3.1]
@@ -1,9 +1,28 @@
 import unittest
-from core import search, problem
+from core import search, problem, batch
+from core.oracle import DistanceOracle
+from core.cache import RouteCache
+from core.aio import search_async, solve_all
+from core.monitor import SearchMonitor, PHASES, memory_report
+from core.incremental import LPAStar
+from core.landmarks import Landmarks, ALTProblem
+from core.contraction import ContractionHierarchy
+from core.loader import load_dimacs, load_edge_list, read_lines
+from core.spatial import GridIndex, LocationIndex
+from benchmark import suite
+from core.graph import CompactGraph, save_compact_graph, open_compact_graph
 from collections import namedtuple, deque
-import time
+import asyncio
+import copy
+import gc
+import os
+import random
+import tempfile
+import tracemalloc
+import weakref
 
-from core.utils import FIFOQueue, Stack
+from core.utils import FIFOQueue, Stack, PriorityQueue, distance, infinity, argmin
+from core.node import Node, NodeArena
 
 # Defining a namedtuple for the search results
 Result = namedtuple('Result', ['generated', 'visited', 'total_cost', 'path'])
@@ -57,17 +76,6 @@ class SearchAlgorithmTests(unittest.TestCase):
             'Mehadia-Fagaras': Result(generated=25, visited=16, total_cost=520, path=['F', 'S', 'R', 'C', 'D', 'M'])
         }
 
-    def __measure_execution_time(self, problem, fringe, sort_function=None):
-        """
-        Función para medir el tiempo de ejecución de un algoritmo de búsqueda.
-        """
-        start_time = time.perf_counter()
-        search.graph_search(problem, fringe, sort_function)
-        end_time = time.perf_counter()
-        execution_time = (end_time - start_time)* 1000  # Convertir a milisegundos
-        return execution_time
-
-
     def __test_with_function(self, search_function=None, expected_results=None, print_enable=False):
         if search_function is None or expected_results is None:
             return
@@ -107,22 +115,6 @@ class SearchAlgorithmTests(unittest.TestCase):
                 print("[PATH] Res: ", self.result.path, " | Exp: ", expected_results[route].path)
             self.assertEqual(expected_path, returned_path)
 
-    def test_times(self):
-        print("\n========================TIEMPOS DE EJECUCIÓN========================")
-        for route in self.routes:
-            # Check the result is not None
-            problem = self.problems[route]
-            time_bfs = self.__measure_execution_time(problem, FIFOQueue())
-            time_dfs = self.__measure_execution_time(problem, Stack())
-            time_bab = self.__measure_execution_time(problem, deque())
-            time_bab_s = self.__measure_execution_time(problem, deque())
-
-            print("--------------", route, "--------------")
-            print("Tiempo BFS:", time_bfs, "ms")
-            print("Tiempo DFS:", time_dfs, "ms")
-            print("Tiempo Branch and Bound:", time_bab, "ms")
-            print("Tiempo Branch and Bound con Subestimación:", time_bab_s, "ms")
-
     def test_breadth_first_search(self):
         self.__test_with_function(search_function=search.breadth_first_graph_search,
                                   expected_results=self.resultsBFS, print_enable=False)
@@ -139,6 +131,692 @@ class SearchAlgorithmTests(unittest.TestCase):
         self.__test_with_function(search_function=search.branch_and_bound_underestimation,
                                   expected_results=self.resultsBAB_U, print_enable=False)
 
+    def test_sort_function_fringe(self):
+        # A plain deque plus a sort function must behave like the PriorityQueue fringe
+        self.__test_with_function(search_function=lambda p: search.graph_search(p, deque(), search.sort_by_underestimation),
+                                  expected_results=self.resultsBAB_U, print_enable=False)
+
+    def test_branch_and_bound_to_many(self):
+        goals = ['B', 'E', 'Z', 'D', 'F']
+        generated, visited, results = search.branch_and_bound_to_many(problem.GPSProblem('A', None, search.romania), goals)
+        self.assertEqual(set(goals), set(results))
+        for goal in goals:
+            expected = search.branch_and_bound(problem.GPSProblem('A', goal, search.romania))
+            cost, path = results[goal]
+            self.assertEqual(expected[2], cost)
+            self.assertEqual(goal, path[0].state)
+            self.assertLessEqual(expected[1], visited)
+
+        # With a single goal it does exactly the work of branch_and_bound
+        self.assertEqual((31, 24), search.branch_and_bound_to_many(self.problems['Arad-Bucharest'], ['B'])[:2])
+
+    def test_bidirectional_branch_and_bound(self):
+        for algorithm in (search.bidirectional_branch_and_bound,
+                          search.bidirectional_branch_and_bound_underestimation):
+            for start in search.romania.nodes():
+                for goal in search.romania.nodes():
+                    expected = search.branch_and_bound(problem.GPSProblem(start, goal, search.romania))
+                    result = algorithm(problem.GPSProblem(start, goal, search.romania))
+                    self.assertEqual(expected[2], result[2])
+                    self.assertEqual([goal, start], [result[3][0].state, result[3][-1].state])
+
+        result = search.bidirectional_branch_and_bound(self.problems['Arad-Bucharest'])
+        self.assertEqual(['<Node B>', '<Node P>', '<Node R>', '<Node S>', '<Node A>'], [str(n) for n in result[3]])
+        self.assertRaises(ValueError, search.bidirectional_branch_and_bound,
+                          problem.GPSProblem('A', 'B', search.Graph({'A': {'B': 1}})))
+
+    def test_heuristic_table(self):
+        locations = search.romania.locations
+        for goal in search.romania.nodes():
+            gps = problem.GPSProblem('A', goal, search.romania)
+            for state in search.romania.nodes():
+                self.assertEqual(int(distance(locations[state], locations[goal])), gps.h(Node(state)))
+        # Problems with the same graph and goal share one table
+        first, second = problem.GPSProblem('A', 'B', search.romania), problem.GPSProblem('O', 'B', search.romania)
+        first.h(Node('A')), second.h(Node('O'))
+        self.assertIs(first.h_table, second.h_table)
+        self.assertEqual(infinity, problem.GPSProblem('A', 'B', search.Graph({'A': {'B': 1}})).h(Node('A')))
+        # A problem notices new locations; the cache lets go of dropped graphs
+        graph = search.UndirectedGraph({'A': {'B': 1}})
+        graph.locations = {'A': (0, 0), 'B': (3, 4)}
+        gps = problem.GPSProblem('A', 'B', graph)
+        self.assertEqual(5, gps.h(Node('A')))
+        graph.locations = {'A': (0, 0), 'B': (6, 8)}
+        self.assertEqual(10, gps.h(Node('A')))
+        compact = CompactGraph.from_graph(search.romania)
+        problem.GPSProblem('A', 'B', compact).h(Node('A'))
+        dropped = weakref.ref(compact)
+        del compact
+        gc.collect()
+        self.assertIsNone(dropped())
+
+    def test_arena_graph_search(self):
+        for (fringe, sort_function, expected_results) in [(FIFOQueue, None, self.resultsBFS),
+                                                          (Stack, None, self.resultsDFS),
+                                                          (Stack, search.sort_by_underestimation, self.resultsBAB_U)]:
+            self.__test_with_function(search_function=lambda p: search.arena_graph_search(p, fringe(), sort_function),
+                                      expected_results=expected_results, print_enable=False)
+
+    def test_bidirectional_iterator_replays_steps(self):
+        def snapshot(item):
+            generated, visited, path_cost, path, closed, fringe = item[:6]
+            return generated, visited, path_cost, [n.state for n in path], sorted(closed), [n.state for n in fringe]
+
+        for route in self.routes:
+            for (fringe, sort_function) in [(FIFOQueue, None), (Stack, None), (deque, search.sort_by_underestimation)]:
+                expected = [snapshot(item) for item in
+                            search.graph_search_generator(self.problems[route], fringe(), sort_function)]
+                iterator = search.BidirectionalIterator(
+                    search.graph_search_generator(self.problems[route], fringe(), sort_function), checkpoint_interval=3)
+                self.assertEqual(expected, [snapshot(iterator.next()) for _ in expected])
+                self.assertRaises(StopIteration, iterator.next)
+                for step in reversed(range(len(expected) - 1)):
+                    self.assertEqual(expected[step], snapshot(iterator.prev()))
+                self.assertRaises(IndexError, iterator.prev)
+                for step in (len(expected) - 1, 4, 0, 2):
+                    self.assertEqual(expected[step], snapshot(iterator.seek(step)))
+
+    def test_pruned_search(self):
+        for start in search.romania.nodes():
+            for goal in search.romania.nodes():
+                gps = problem.GPSProblem(start, goal, search.romania)
+                for algorithm in (search.branch_and_bound, search.branch_and_bound_underestimation):
+                    stats = {}
+                    expected, result = algorithm(gps), algorithm(gps, prune=True, stats=stats)
+                    self.assertEqual(expected[2], result[2])
+                    self.assertLessEqual(result[0], expected[0])
+                    self.assertEqual((result[0], result[1]), (stats['generated'], stats['visited']))
+
+        stats = {}
+        result = search.branch_and_bound(self.problems['Oradea-Eforie'], prune=True, stats=stats)
+        self.assertEqual((20, 18, 698), result[:3])
+        self.assertEqual({'generated': 20, 'visited': 18, 'suppressed_closed': 20,
+                          'suppressed_dominated': 3, 'stale': 1}, stats)
+        stats = {}
+        result = search.branch_and_bound(self.problems['Oradea-Eforie'], stats=stats)
+        self.assertEqual({'generated': result[0], 'visited': result[1]}, stats)
+
+    def test_memory_bounded_searches(self):
+        for algorithm in (search.iterative_deepening_a_star, search.recursive_best_first_search):
+            for route in self.routes:
+                result = algorithm(self.problems[route])
+                self.assertEqual(self.resultsBAB_U[route].total_cost, result[2])
+                self.assertEqual(self.resultsBAB_U[route].path, [n.state for n in result[3]])
+            no_route = problem.GPSProblem('A', 'X', search.Graph({'A': {'B': 1}, 'B': {'A': 1}}))
+            self.assertIsNone(algorithm(no_route))
+            # Without locations h is ignored; an unreachable goal is not
+            # looked for along every path of a dense graph
+            dense = search.UndirectedGraph({a: {b: 1 for b in range(12) if b != a} for a in range(12)})
+            dense.connect(12, 13)
+            self.assertIsNone(algorithm(problem.GPSProblem(0, 13, dense)))
+            plain = search.Graph({'A': {'B': 1}, 'B': {'C': 2}})
+            self.assertEqual(3, algorithm(problem.GPSProblem('A', 'C', plain))[2])
+            # Solutions deeper than the recursion limit
+            chain = search.UndirectedGraph()
+            for i in range(1500):
+                chain.connect(i, i + 1, 10)
+            chain.locations = {i: (10 * i, 0) for i in range(1501)}
+            result = algorithm(problem.GPSProblem(0, 1500, chain))
+            self.assertEqual(15000, result[2])
+            self.assertEqual(list(range(1500, -1, -1)), [n.state for n in result[3]])
+        self.assertEqual((12, 6, 418), search.recursive_best_first_search(self.problems['Arad-Bucharest'])[:3])
+
+
+class SearchMonitorTests(unittest.TestCase):
+    class Recorder(SearchMonitor):
+        def start(self, problem):
+            SearchMonitor.start(self, problem)
+            self.events = []
+
+        def on_pop(self, node):
+            self.events.append(('pop', node.state))
+
+        def on_expand(self, node, successors):
+            self.events.append(('expand', node.state, len(successors)))
+
+        def on_goal(self, node):
+            self.events.append(('goal', node.state))
+
+    def test_same_result_and_metrics(self):
+        monitor = self.Recorder()
+        for function in [search.breadth_first_graph_search, search.depth_first_graph_search,
+                         search.branch_and_bound, search.branch_and_bound_underestimation]:
+            gps = problem.GPSProblem('O', 'E', search.romania)
+            expected = function(gps)
+            self.assertEqual(expected, function(gps, monitor=monitor))
+            report = monitor.report()
+            self.assertEqual(expected[:2], (report['generated'], report['visited']))
+            pops = [e for e in monitor.events if e[0] == 'pop']
+            expansions = [e for e in monitor.events if e[0] == 'expand']
+            self.assertEqual(expected[1], len(pops))
+            self.assertEqual(report['expansions'], len(expansions))
+            self.assertEqual(expected[0], 1 + sum(e[2] for e in expansions))
+            self.assertEqual(('goal', 'E'), monitor.events[-1])
+            self.assertEqual(report['expansions'], report['peak_closed'])
+            self.assertGreaterEqual(report['peak_fringe'], 1)
+            self.assertEqual(set(PHASES), set(report['timers']))
+            self.assertLessEqual(sum(report['timers'].values()), report['elapsed'])
+
+    def test_memory_report(self):
+        random.seed(3)
+        graph = search.RandomGraph(list(range(300)), 3)
+        for function in [search.breadth_first_graph_search, search.branch_and_bound_underestimation]:
+            gps = problem.GPSProblem(0, 299, graph)
+            result, report = memory_report(function, gps)
+            self.assertEqual(function(gps), result)
+            self.assertFalse(tracemalloc.is_tracing())
+            self.assertGreater(report['peak_bytes'], 0)
+            self.assertEqual(report['peak_bytes'] / result[0], report['bytes_per_node'])
+            self.assertEqual(report['expansions'], report['closed_states'])
+            self.assertGreaterEqual(report['tree_nodes'], max(report['fringe_nodes'], len(result[3])))
+            self.assertLessEqual(report['tree_nodes'], result[0])
+
+    def test_prune_and_monitor(self):
+        with self.assertRaises(ValueError):
+            search.branch_and_bound(problem.GPSProblem('A', 'B', search.romania),
+                                    prune=True, monitor=SearchMonitor())
+        with self.assertRaises(ValueError):
+            search.branch_and_bound(problem.GPSProblem('A', 'B', search.romania),
+                                    stats={}, monitor=SearchMonitor())
+
+
+class AsyncSearchTests(unittest.TestCase):
+    def test_same_results_as_blocking_search(self):
+        for (name, function) in batch.ALGORITHMS.items():
+            for (start, goal) in [('A', 'B'), ('G', 'Z')]:
+                gps = problem.GPSProblem(start, goal, search.romania)
+                self.assertEqual(function(gps), asyncio.run(search_async(gps, name, expansions=2)))
+        graph = search.UndirectedGraph({'A': {'B': 1}, 'C': {'D': 1}})
+        self.assertIsNone(asyncio.run(search_async(problem.GPSProblem('A', 'D', graph))))
+
+    def test_queries_take_turns_and_time_out(self):
+        random.seed(0)
+        graph = search.RandomGraph(list(range(2000)), 3)
+        problems = [problem.GPSProblem(0, 1999, graph), problem.GPSProblem('A', 'B', search.romania)]
+        order = []
+
+        async def run():
+            async def tick():
+                order.append('tick')
+            slow = asyncio.ensure_future(search_async(problems[0], 'bfs', expansions=5))
+            fast = asyncio.ensure_future(search_async(problems[1], 'bfs', expansions=5))
+            await asyncio.gather(tick())
+            result = await fast
+            order.append('fast')
+            await slow
+            order.append('slow')
+            return result
+
+        self.assertEqual(search.breadth_first_graph_search(problems[1]), asyncio.run(run()))
+        self.assertEqual(['tick', 'fast', 'slow'], order)
+
+        # The deadline is checked every 10 expansions, so only the long query times out
+        results = asyncio.run(solve_all(problems, 'bfs', expansions=10, timeout=0))
+        self.assertIsInstance(results[0], asyncio.TimeoutError)
+        self.assertEqual(search.breadth_first_graph_search(problems[1]), results[1])
+
+
+class NodeTests(unittest.TestCase):
+    def test_slotted_node(self):
+        node = Node('B', Node('A'), 'B', 10)
+        self.assertFalse(hasattr(node, '__dict__'))
+        self.assertEqual((1, 10), (node.depth, node.path_cost))
+        self.assertEqual(['B', 'A'], [n.state for n in node.path()])
+
+    def test_arena_rows(self):
+        arena = NodeArena(capacity=1)
+        root = arena.add('A')
+        children = arena.expand(root, problem.GPSProblem('A', 'B', search.romania))
+        self.assertEqual(['Z', 'S', 'T'], [arena.state_of(i) for i in children])
+        self.assertEqual(4, len(arena))
+        view = arena.view(children[1])
+        self.assertEqual(('S', 140, 1, root), (view.state, view.path_cost, view.depth, view.parent))
+        self.assertEqual(['<Node T>', '<Node A>'], [str(n) for n in arena.path(children[2])])
+
+
+class PriorityQueueTests(unittest.TestCase):
+    def test_pops_lowest_first(self):
+        queue = PriorityQueue(len, ['ccc', 'a', 'bb'])
+        self.assertEqual(1, queue.top_key())
+        self.assertEqual(['a', 'bb', 'ccc'], [queue.pop() for _ in range(3)])
+        self.assertEqual(0, len(queue))
+
+    def test_ties_follow_insertion_order(self):
+        queue = PriorityQueue(lambda x: x[0])
+        queue.extend([(1, 'a'), (0, 'b'), (1, 'c')])
+        queue.append((0, 'd'))
+        self.assertEqual([(0, 'b'), (0, 'd'), (1, 'a'), (1, 'c')], list(queue))
+        self.assertEqual([(0, 'b'), (0, 'd'), (1, 'a'), (1, 'c')], [queue.pop() for _ in range(4)])
+
+
+class CompactGraphTests(unittest.TestCase):
+    def test_same_links_as_graph(self):
+        for symmetric in (False, True):
+            graph = CompactGraph.from_graph(search.romania, symmetric=symmetric)
+            self.assertEqual(sorted(search.romania.nodes()), sorted(graph.nodes()))
+            for a in search.romania.nodes():
+                self.assertEqual(search.romania.get(a), graph.get(a))
+                self.assertEqual(search.romania.locations[a], graph.locations[a])
+            self.assertIsNone(graph.get('A', 'B'))
+
+    def test_searches_match_graph(self):
+        graph = CompactGraph.from_graph(search.romania)
+        for algorithm in (search.breadth_first_graph_search, search.depth_first_graph_search,
+                          search.branch_and_bound, search.branch_and_bound_underestimation):
+            expected = algorithm(problem.GPSProblem('O', 'E', search.romania))
+            result = algorithm(problem.GPSProblem('O', 'E', graph))
+            self.assertEqual(expected[:3], result[:3])
+            self.assertEqual([n.state for n in expected[3]], [n.state for n in result[3]])
+
+    def test_symmetric_storage_keeps_optimal_costs(self):
+        graph = CompactGraph.from_graph(search.romania, symmetric=True)
+        self.assertEqual(23, graph.edge_count())
+        result = search.branch_and_bound(problem.GPSProblem('A', 'B', graph))
+        self.assertEqual(418, result[2])
+
+    def test_binary_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'romania.graph')
+            for symmetric in (True, False):
+                compact = CompactGraph.from_graph(search.romania, symmetric=symmetric)
+                save_compact_graph(compact, filename, heuristics={'to_B': [float(n == 'B') for n in compact.names]})
+                graph = open_compact_graph(filename)
+                self.assertEqual(symmetric, graph.symmetric)
+                self.assertEqual(search.romania.get('R'), graph.get('R'))
+                self.assertEqual(search.romania.locations['R'], graph.locations['R'])
+                self.assertEqual(1.0, graph.heuristics['to_B'][graph.index['B']])
+                self.assertEqual(698, search.branch_and_bound_underestimation(problem.GPSProblem('O', 'E', graph))[2])
+
+            jobs = [('A', 'B', 'bab'), ('O', 'E', 'bfs')]
+            self.assertEqual([(job, batch.solve(search.romania, job)) for job in jobs],
+                             list(batch.solve_batch(filename, jobs, processes=2)))
+            # A mapped graph holds memoryviews, which are shared like arrays
+            self.assertEqual([(job, batch.solve(search.romania, job)) for job in jobs],
+                             list(batch.solve_batch(open_compact_graph(filename), jobs, processes=2)))
+            with open(filename, 'wb') as f:
+                f.write(b'not a graph file at all')
+            self.assertRaises(ValueError, open_compact_graph, filename)
+            with open(filename, 'wb') as f:
+                f.write(b'FSIGRAPH')
+            self.assertRaises(ValueError, open_compact_graph, filename)
+
+    def test_binary_file_names(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'grid.graph')
+            names = {(0, 0): {(0, 1): 3, ('a', (1, 2.5)): 4}, (0, 1): {None: 1, True: 2}}
+            compact = CompactGraph.from_graph(search.UndirectedGraph(names))
+            save_compact_graph(compact, filename)
+            graph = open_compact_graph(filename)
+            self.assertEqual(list(compact.names), list(graph.names))
+            self.assertEqual({(0, 1): 3, ('a', (1, 2.5)): 4}, graph.get((0, 0)))
+
+            os.remove(filename)
+            compact = CompactGraph.from_graph(search.UndirectedGraph({frozenset('A'): {'B': 1}}))
+            self.assertRaises(ValueError, save_compact_graph, compact, filename)
+            self.assertFalse(os.path.exists(filename))
+
+    def test_frozen(self):
+        graph = CompactGraph.from_graph(search.romania)
+        self.assertRaises(TypeError, graph.connect, 'A', 'B', 1)
+
+
+class BatchTests(unittest.TestCase):
+    def test_solve_batch_matches_single_searches(self):
+        jobs = [(start, goal, algorithm) for (start, goal) in [('A', 'B'), ('O', 'E'), ('N', 'D')]
+                for algorithm in ('bfs', 'dfs', 'bab', search.branch_and_bound_underestimation)]
+        expected = [(job, batch.solve(search.romania, job)) for job in jobs]
+        self.assertEqual(expected, list(batch.solve_batch(search.romania, jobs, processes=2)))
+
+        # CompactGraph workers read the graph from shared memory
+        graph = CompactGraph.from_graph(search.romania)
+        results = list(batch.solve_batch(graph, jobs, processes=2, ordered=False, chunksize=1))
+        self.assertEqual(sorted(expected, key=str), sorted(results, key=str))
+
+
+class DistanceOracleTests(unittest.TestCase):
+    def test_matches_branch_and_bound(self):
+        oracle = DistanceOracle(search.romania)
+        for (start, goal) in [('A', 'B'), ('O', 'E'), ('G', 'Z'), ('N', 'D'), ('M', 'F')]:
+            expected = search.branch_and_bound(problem.GPSProblem(start, goal, search.romania))
+            self.assertEqual(expected[2], oracle.distance(start, goal))
+            self.assertEqual([n.state for n in reversed(expected[3])], oracle.path(start, goal))
+        self.assertEqual(['A'], oracle.path('A', 'A'))
+
+    def test_save_and_invalidate(self):
+        graph = copy.deepcopy(search.romania)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'romania.oracle')
+            DistanceOracle.open(filename, graph)
+            oracle = DistanceOracle.open(filename, graph)
+            self.assertEqual(418, oracle.distance('A', 'B'))
+
+            # A new road makes the loaded tables stale
+            graph.connect('A', 'B', 100)
+            self.assertTrue(oracle.stale())
+            self.assertEqual(100, oracle.distance('A', 'B'))
+            self.assertEqual(['A', 'B'], oracle.path('A', 'B'))
+            self.assertEqual(100, DistanceOracle.open(filename, graph).distance('A', 'B'))
+
+
+class RouteCacheTests(unittest.TestCase):
+    def test_hits_and_evictions(self):
+        cache = RouteCache(maxsize=2)
+        first = cache.solve(problem.GPSProblem('A', 'B', search.romania))
+        self.assertEqual(418, first[2])
+        self.assertIs(first, cache.solve(problem.GPSProblem('A', 'B', search.romania), 'bab'))
+        self.assertEqual(450, cache.solve(problem.GPSProblem('A', 'B', search.romania), 'bfs')[2])
+        cache.solve(problem.GPSProblem('O', 'E', search.romania), search.branch_and_bound)
+        stats = cache.stats()
+        self.assertEqual((1, 3, 1, 2), (stats.hits, stats.misses, stats.evictions, stats.size))
+        # A -> B with bab was the least recently used entry
+        self.assertIsNot(first, cache.solve(problem.GPSProblem('A', 'B', search.romania)))
+
+    def test_graph_changes_invalidate(self):
+        graph = copy.deepcopy(search.romania)
+        cache = RouteCache()
+        self.assertEqual(418, cache.solve(problem.GPSProblem('A', 'B', graph))[2])
+        cache.solve(problem.GPSProblem('O', 'E', graph))
+        cache.solve(problem.GPSProblem('A', 'B', search.romania))
+        graph.connect('A', 'B', 100)
+        self.assertEqual(100, cache.solve(problem.GPSProblem('A', 'B', graph))[2])
+        self.assertEqual((2, 2), (cache.invalidations, len(cache)))
+        self.assertEqual(0, cache.hits)
+
+    def test_problem_class_and_key(self):
+        cache = RouteCache()
+        self.assertEqual((32, 15), cache.solve(problem.GPSProblem('O', 'E', search.romania), 'bab_u')[:2])
+        landmarks = Landmarks(search.romania, k=4, seed=0)
+        alt = ALTProblem('O', 'E', search.romania, landmarks)
+        expected = search.branch_and_bound_underestimation(alt)
+        self.assertEqual(expected[:3], cache.solve(alt, 'bab_u')[:3])
+        self.assertEqual(0, cache.hits)
+        # Other landmarks only share the entry when the caller says so
+        other = ALTProblem('O', 'E', search.romania, Landmarks(search.romania, k=1, seed=0))
+        self.assertIsNot(cache.solve(other, 'bab_u', key=1), cache.solve(alt, 'bab_u'))
+        self.assertEqual((1, 3), (cache.hits, cache.misses))
+
+
+class AnytimeSearchTests(unittest.TestCase):
+    def test_ends_optimal(self):
+        for (start, goal) in [('A', 'B'), ('O', 'E'), ('G', 'Z'), ('N', 'D'), ('M', 'F')]:
+            gps = problem.GPSProblem(start, goal, search.romania)
+            expected = search.branch_and_bound(gps)
+            result = search.anytime_weighted_a_star(gps)
+            self.assertEqual(expected[2], result[2])
+            self.assertEqual(1.0, result[4])
+            self.assertEqual(start, result[3][-1].state)
+            self.assertEqual(result[2], result[3][0].path_cost)
+
+    def test_budget_and_bound(self):
+        random.seed(4)
+        graph = search.RandomGraph(list(range(3000)), 3)
+        gps = problem.GPSProblem(0, 2999, graph)
+        optimal = search.branch_and_bound(gps)[2]
+        costs = []
+        for budget in [50, 100, 200, None]:
+            result = search.anytime_weighted_a_star(gps, weight=3, node_budget=budget)
+            self.assertLessEqual(result[1], budget or infinity)
+            self.assertLessEqual(optimal, result[2])
+            self.assertLessEqual(result[2], result[4] * optimal)
+            costs.append(result[2])
+        self.assertEqual(sorted(costs, reverse=True), costs)
+        self.assertEqual(optimal, costs[-1])
+        self.assertIsNone(search.anytime_weighted_a_star(gps, timeout=0))
+
+
+class BoundedSearchTests(unittest.TestCase):
+    routes = [('A', 'B'), ('O', 'E'), ('G', 'Z'), ('N', 'D'), ('M', 'F')]
+
+    def test_bounded_best_first_is_optimal_with_room(self):
+        for (start, goal) in self.routes:
+            gps = problem.GPSProblem(start, goal, search.romania)
+            expected = search.branch_and_bound(gps)[2]
+            for cap in [10, 1000]:
+                result = search.bounded_best_first_search(gps, max_nodes=cap)
+                self.assertEqual(expected, result[2])
+                self.assertEqual(start, result[3][-1].state)
+                self.assertEqual(goal, result[3][0].state)
+        # Oradea-Eforie is 8 nodes long and cannot be held in 5
+        self.assertIsNone(search.bounded_best_first_search(problem.GPSProblem('O', 'E', search.romania), max_nodes=5))
+
+    def test_bounded_best_first_on_random_graphs(self):
+        for seed in range(10):
+            random.seed(seed)
+            gps = problem.GPSProblem(0, 24, search.RandomGraph(list(range(25)), 2))
+            expected = search.branch_and_bound(gps)
+            for sort_function in [search.sort_by_underestimation, lambda n, p: n.path_cost]:
+                result = search.bounded_best_first_search(gps, sort_function, max_nodes=12)
+                self.assertEqual(expected and expected[2], result and result[2])
+
+    def test_binding_cap_bounds_expansions(self):
+        random.seed(15)
+        gps = problem.GPSProblem(13, 0, search.RandomGraph(list(range(50)), 2))
+        expected = search.branch_and_bound(gps)
+        self.assertGreater(expected[0], 20)  # More nodes than any cap below
+        for cap in [8, 12, 20]:
+            for sort_function in [search.sort_by_underestimation, lambda n, p: n.path_cost]:
+                result = search.bounded_best_first_search(gps, sort_function, max_nodes=cap)
+                self.assertEqual(expected[2], result[2])
+                self.assertLess(result[1], 4 * expected[1])
+
+    def test_beam_width(self):
+        gps = problem.GPSProblem('O', 'E', search.romania)
+        self.assertEqual(730, search.beam_search(gps, width=1)[2])
+        result = search.beam_search(gps, width=2)
+        self.assertEqual(698, result[2])
+        self.assertEqual(['E', 'H', 'U', 'B', 'P', 'R', 'S', 'O'], [n.state for n in result[3]])
+        for (start, goal) in self.routes:
+            gps = problem.GPSProblem(start, goal, search.romania)
+            self.assertLessEqual(search.branch_and_bound(gps)[2], search.beam_search(gps, width=1)[2])
+
+
+class LPAStarTests(unittest.TestCase):
+    def test_replans_like_a_fresh_search(self):
+        graph = copy.deepcopy(search.romania)
+        planner = LPAStar(problem.GPSProblem('A', 'B', graph))
+        first = planner.plan()
+        self.assertEqual(418, first[2])
+        self.assertEqual(['B', 'P', 'R', 'S', 'A'], [n.state for n in first[3]])
+        # Close R-P, then the route through Fagaras is the best one
+        for (a, b, cost) in [('R', 'P', 1000), ('S', 'F', 120), ('P', 'B', 90)]:
+            planner.update_edge(a, b, cost)
+            result = planner.plan()
+            expected = search.branch_and_bound(problem.GPSProblem('A', 'B', graph))
+            self.assertEqual(expected[2], result[2])
+            self.assertEqual(result[2], result[3][0].path_cost)
+            self.assertEqual('A', result[3][-1].state)
+            self.assertLess(result[1], first[1])
+        self.assertEqual(['B', 'F', 'S', 'A'], [n.state for n in planner.plan()[3]])
+
+    def test_random_updates_on_directed_graph(self):
+        random.seed(7)
+        nodes = list(range(30))
+        graph = search.RandomGraph(nodes, 2)
+        graph.directed = True
+        planner = LPAStar(problem.GPSProblem(0, 29, graph), underestimation=False)
+        for step in range(40):
+            (a, b) = random.sample(nodes, 2)
+            if step % 10 == 9:
+                graph.connect(a, b, random.randint(1, 300))  # Not through the planner
+            else:
+                planner.update_edge(a, b, random.randint(1, 300))
+            expected = search.branch_and_bound(problem.GPSProblem(0, 29, graph))
+            result = planner.plan()
+            self.assertEqual(expected and expected[2], result and result[2])
+
+
+class LandmarkTests(unittest.TestCase):
+    def test_alt_is_optimal_and_visits_less(self):
+        landmarks = Landmarks(search.romania, k=4, seed=1)
+        visited_alt = visited_straight = 0
+        for start in search.romania.nodes():
+            for goal in search.romania.nodes():
+                expected = search.branch_and_bound_underestimation(problem.GPSProblem(start, goal, search.romania))
+                result = search.branch_and_bound_underestimation(ALTProblem(start, goal, search.romania, landmarks))
+                self.assertEqual(expected[2], result[2])
+                visited_straight += expected[1]
+                visited_alt += result[1]
+        self.assertLess(visited_alt, visited_straight)
+
+    def test_without_locations_and_persisted(self):
+        graph = search.UndirectedGraph(copy.deepcopy(search.romania.dict))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'romania.landmarks')
+            built = Landmarks.open(filename, graph, k=3, seed=2)
+            landmarks = Landmarks.open(filename, graph, k=3, seed=2)
+            self.assertEqual(3, len(landmarks.landmarks))
+            self.assertEqual(built.landmarks, landmarks.landmarks)
+            result = search.branch_and_bound_underestimation(ALTProblem('A', 'B', graph, landmarks))
+            self.assertEqual(418, result[2])
+
+            # Tables built with another seed are not reused
+            for seed in range(3, 20):
+                other = Landmarks.open(filename, graph, k=3, seed=seed)
+                self.assertEqual(seed, other.seed)
+                self.assertEqual(Landmarks(graph, k=3, seed=seed).landmarks, other.landmarks)
+
+
+class ContractionHierarchyTests(unittest.TestCase):
+    def test_queries_match_branch_and_bound(self):
+        hierarchy = ContractionHierarchy(search.romania)
+        for start in search.romania.nodes():
+            for goal in search.romania.nodes():
+                expected = search.branch_and_bound(problem.GPSProblem(start, goal, search.romania))
+                result = hierarchy.query(start, goal)
+                self.assertEqual(expected[2], result[2])
+                self.assertEqual(expected[2], result[3][0].path_cost)
+                self.assertEqual([goal, start], [result[3][0].state, result[3][-1].state])
+        result = hierarchy.query('A', 'B')
+        self.assertEqual(['<Node B>', '<Node P>', '<Node R>', '<Node S>', '<Node A>'], [str(n) for n in result[3]])
+
+    def test_directed_graph_and_persistence(self):
+        graph = search.Graph({'A': {'B': 1, 'C': 5}, 'B': {'C': 1}, 'C': {'A': 1, 'D': 2}})
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'graph.ch')
+            ContractionHierarchy.open(filename, graph)
+            hierarchy = ContractionHierarchy.open(filename, graph)
+            self.assertEqual(4, hierarchy.query('A', 'D')[2])
+            self.assertEqual(2, hierarchy.query('B', 'A')[2])
+            self.assertIsNone(hierarchy.query('D', 'A'))
+
+
+class LoaderTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        filename = os.path.join(self.directory.name, name)
+        with open(filename, 'w') as f:
+            f.write(text)
+        return filename
+
+    def test_dimacs(self):
+        gr = self.write('road.gr', 'c sample\np sp 4 5\na 1 2 3\na 2 1 3\na 2 3 4\na 3 4 1.5\na 1 4 10\n')
+        co = self.write('road.co', 'p aux sp co 4\nv 1 0 0\nv 2 3 0\nv 3 3 4\nv 4 4 4\n')
+        for compact in (True, False):
+            graph = load_dimacs(gr, co, compact=compact)
+            self.assertEqual({2: 3, 4: 10}, graph.get(1))
+            self.assertEqual((3, 4), graph.locations[3])
+            self.assertEqual(8.5, search.branch_and_bound(problem.GPSProblem(1, 4, graph))[2])
+
+    def test_edge_list(self):
+        edges = self.write('roads.csv', 'from,to,km\nA,B,5\nB,C,2\nA,C,9\n')
+        nodes = self.write('nodes.csv', 'node,x,y\nA,0,0\nB,1,0\nC,2,0\n')
+        for compact in (True, False):
+            graph = load_edge_list(edges, nodes, compact=compact)
+            self.assertEqual({'B': 2, 'A': 9}, graph.get('C'))
+            self.assertEqual((1, 0), graph.locations['B'])
+            self.assertEqual(7, search.branch_and_bound_underestimation(problem.GPSProblem('A', 'C', graph))[2])
+        partial = self.write('partial.csv', 'node,x,y\nA,0,0\nC,2,0\n')
+        with self.assertRaisesRegex(ValueError, "'B'"):
+            load_edge_list(edges, partial, compact=True)
+
+    def test_read_lines_in_chunks(self):
+        filename = self.write('lines.txt', 'one\ntwo\nthree\nlast line without newline')
+        self.assertEqual([b'one', b'two', b'three', b'last line without newline'], list(read_lines(filename, chunk_size=5)))
+        self.assertEqual([], list(read_lines(self.write('empty.txt', ''))))
+
+
+class SpatialTests(unittest.TestCase):
+    @staticmethod
+    def scan_random_graph(nodes, min_links, width, height):
+        """RandomGraph as it was written before the grid index: scan every node."""
+        g = search.UndirectedGraph()
+        g.locations = {node: (random.randrange(width), random.randrange(height)) for node in nodes}
+        for i in range(min_links):
+            for node in nodes:
+                if len(g.get(node)) < min_links:
+                    here = g.locations[node]
+                    neighbor = argmin(nodes, lambda n: infinity if n is node or g.get(node, n)
+                                      else distance(g.locations[n], here))
+                    g.connect(node, neighbor, int(distance(g.locations[neighbor], here) * random.uniform(1.1, 1.5)))
+        return g
+
+    def test_random_graph_matches_full_scan(self):
+        for seed in range(5):
+            for (size, min_links, width, height) in [(10, 2, 400, 300), (300, 3, 400, 300), (200, 4, 20, 20), (3, 5, 10, 10)]:
+                random.seed(seed)
+                expected = self.scan_random_graph(list(range(size)), min_links, width, height)
+                random.seed(seed)
+                graph = search.RandomGraph(list(range(size)), min_links, width, height)
+                self.assertEqual(expected.locations, graph.locations)
+                self.assertEqual([(a, list(b.items())) for (a, b) in expected.dict.items()],
+                                 [(a, list(b.items())) for (a, b) in graph.dict.items()])
+
+    def test_grid_nearest(self):
+        points = [(0, 0), (5, 5), (1, 1), (1, 1), (9, 0)]
+        index = GridIndex(points, cell_size=2)
+        self.assertEqual(2, index.nearest(1.2, 0.9))
+        self.assertEqual(3, index.nearest(1.2, 0.9, exclude=lambda i: i == 2))
+        self.assertEqual(4, index.nearest(100, -3))
+        self.assertIsNone(index.nearest(1, 1, exclude=lambda i: True))
+
+    def test_grid_k_nearest(self):
+        random.seed(3)
+        points = [(random.uniform(0, 50), random.randrange(20)) for _ in range(200)]
+        index = GridIndex(points)
+        for (x, y) in [(0, 0), (25.5, 10), (-40, 90), (49, 3)]:
+            expected = sorted(range(len(points)), key=lambda i: (distance(points[i], (x, y)), i))
+            self.assertEqual(expected[:7], index.k_nearest(x, y, 7))
+            self.assertEqual(expected[0], index.nearest(x, y))
+        self.assertEqual(len(points), len(index.k_nearest(0, 0, 1000)))
+        self.assertEqual([], index.k_nearest(0, 0, 0))
+
+    def test_location_index(self):
+        index = LocationIndex(search.romania)
+        for node in search.romania.nodes():
+            self.assertEqual(node, index.nearest(*search.romania.locations[node]))
+        self.assertEqual(['A', 'M'], index.nearest_many([(90, 490), (170, 340)]))
+        self.assertEqual(['B', 'U', 'P'], index.k_nearest(400, 400, 3))
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_percentile(self):
+        self.assertEqual(3, suite.percentile([5, 1, 3], 50))
+        self.assertEqual(4.5, suite.percentile([1, 2, 3, 4, 5, 6, 7, 8], 50))
+        self.assertAlmostEqual(7.93, suite.percentile(range(1, 9), 99))
+        self.assertEqual(2, suite.percentile([2], 90))
+
+    def test_run_and_compare(self):
+        results = suite.run([30], ['bab', 'bab_u'], queries=3, warmup=0, repeat=2)
+        self.assertEqual(5 * 2 + 2, len(results['results']))
+        # Every query of a random graph is a sample of its own
+        self.assertEqual([2] * 10 + [6] * 2, [e['samples'] for e in results['results']])
+        self.assertEqual([], suite.compare(results, results))
+        faster = copy.deepcopy(results)
+        for entry in faster['results']:
+            entry['median_ms'] /= 2
+        self.assertEqual(len(results['results']), len(suite.compare(results, faster)))
+
+    def test_memory_mode(self):
+        results = suite.run([], ['bfs'], warmup=0, repeat=1, memory_mode=True)
+        self.assertTrue(all(e['peak_bytes'] > 0 and e['bytes_per_node'] > 0 for e in results['results']))
+        smaller = copy.deepcopy(results)
+        smaller['results'][0]['peak_bytes'] //= 4
+        self.assertEqual([(results['results'][0], smaller['results'][0], 'peak_bytes')],
+                         suite.compare(results, smaller, threshold=1))
+
 
 if __name__ == '__main__':
     unittest.main()